@@ -1,16 +1,12 @@
 import streamlit as st
-import folium
-from streamlit_folium import st_folium
-from geopy.distance import geodesic
-import pandas as pd
 from datetime import datetime, timedelta
-import base64
-from io import BytesIO
-from PIL import Image
 import time
 import database as db
-import plotly.express as px
-import plotly.graph_objects as go
+import metrics
+import photos
+
+# folium, streamlit_folium, pandas, plotly and numpy (via eta) are imported in the
+# functions that use them, so the role selection and login pages start without them
 
 st.set_page_config(
     page_title="JeepTrack PH",
@@ -31,7 +27,48 @@ ROUTE_COLORS = {
 
 BATANGAS_CENTER = [13.7565, 121.0583]
 
-db.init_database()
+DEFAULT_SEARCH_RADIUS_KM = 10
+MAX_NEARBY_JEEPNEYS = 50
+CLUSTER_THRESHOLD = 50
+LIVE_REFRESH_SECONDS = 5
+REVIEWS_PER_PAGE = 5
+
+DRIVER_MARKER_CALLBACK = """
+function (row) {
+    var escape = function (value) {
+        return String(value).replace(/[&<>"']/g, function (c) { return '&#' + c.charCodeAt(0) + ';'; });
+    };
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.setIcon(L.AwesomeMarkers.icon({icon: 'bus', prefix: 'fa', markerColor: row[2]}));
+    marker.bindTooltip(function () {
+        return escape(row[3] + ' - ' + row[6] + ' (ETA: ' + row[11] + ' min)');
+    });
+    marker.bindPopup(function () {
+        return "<div style='width: 200px; font-size: 11px;'>"
+            + "<h4 style='color: " + row[4] + "; margin: 0; font-size: 14px;'>🚐 " + escape(row[3]) + "</h4>"
+            + "<hr style='margin: 3px 0;'>"
+            + "<p style='margin: 2px 0;'><b>Driver:</b> " + escape(row[5]) + "</p>"
+            + "<p style='margin: 2px 0;'><b>Plate:</b> " + escape(row[6]) + "</p>"
+            + "<p style='margin: 2px 0;'><b>Rating:</b> " + escape(row[7]) + "</p>"
+            + "<p style='margin: 2px 0;'><b>Seats:</b> " + row[8] + "/" + row[9] + "</p>"
+            + "<p style='margin: 2px 0;'><b>Distance:</b> " + row[10] + " km</p>"
+            + "<p style='color: green; font-weight: bold; margin: 2px 0;'>⏱️ ETA: " + row[11] + " min</p>"
+            + "</div>";
+    }, {maxWidth: 250});
+    return marker;
+}
+"""
+
+@st.cache_resource
+def init_database():
+    if metrics.ENABLED:
+        metrics.instrument_module(db, exclude=db.UNINSTRUMENTED)
+        metrics.start_exporters()
+    db.init_database()
+    db.start_location_compaction()
+    return db.DB_PATH
+
+init_database()
 
 def init_session_state():
     if 'user_role' not in st.session_state:
@@ -47,17 +84,63 @@ def init_session_state():
     if 'show_login' not in st.session_state:
         st.session_state.show_login = True
 
-def image_to_base64(image):
-    buffered = BytesIO()
-    image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+def get_commuter_base_map(location):
+    import folium
+    from folium.plugins import MarkerCluster
+    
+    map_key = tuple(location)
+    cached = st.session_state.get('commuter_base_map')
+    if cached is None or cached[0] != map_key:
+        base_map = folium.Map(
+            location=location,
+            zoom_start=13,
+            tiles="OpenStreetMap"
+        )
+        
+        folium.Marker(
+            location,
+            popup="Your Location",
+            tooltip="You are here",
+            icon=folium.Icon(color="blue", icon="user", prefix='fa')
+        ).add_to(base_map)
+        
+        # Loads the markercluster assets that the driver layer relies on
+        MarkerCluster(control=False).add_to(base_map)
+        
+        cached = (map_key, base_map)
+        st.session_state.commuter_base_map = cached
+    return cached[1]
 
-def calculate_eta(driver_location, commuter_location):
-    distance = geodesic(driver_location, commuter_location).kilometers
-    avg_speed_kmh = 20
-    eta_hours = distance / avg_speed_kmh
-    eta_minutes = int(eta_hours * 60)
-    return eta_minutes, round(distance, 2)
+def build_driver_layer(drivers):
+    import folium
+    from folium.plugins import FastMarkerCluster
+    
+    rows = []
+    for driver in drivers:
+        available_seats = driver['max_capacity'] - driver['current_capacity']
+        rating_display = f"⭐ {driver['average_rating']:.1f}" if driver['average_rating'] > 0 else "No ratings yet"
+        rows.append([
+            driver['location'][0],
+            driver['location'][1],
+            'green' if available_seats > 0 else 'red',
+            driver['route'],
+            ROUTE_COLORS[driver['route']],
+            f"{driver['first_name']} {driver['last_name']}",
+            driver['license_plate'],
+            rating_display,
+            available_seats,
+            driver['max_capacity'],
+            driver['distance_km'],
+            driver['eta_minutes']
+        ])
+    
+    options = {}
+    if len(drivers) <= CLUSTER_THRESHOLD:
+        options['disableClusteringAtZoom'] = 1
+    
+    driver_layer = folium.FeatureGroup(name="Jeepneys")
+    FastMarkerCluster(rows, callback=DRIVER_MARKER_CALLBACK, **options).add_to(driver_layer)
+    return driver_layer
 
 def role_selection_page():
     st.markdown("""
@@ -181,11 +264,9 @@ def driver_registration_page():
         if submitted:
             if not all([first_name, last_name, contact_number, license_number, license_plate, photo]):
                 st.error("Please fill in all required fields marked with *")
+            elif not photos.is_image(photo.getvalue()):
+                st.error("The uploaded photo could not be read. Please upload a JPG or PNG image.")
             else:
-                image = Image.open(photo)
-                image.thumbnail((200, 200))
-                image_b64 = image_to_base64(image)
-                
                 driver_data = {
                     'first_name': first_name,
                     'last_name': last_name,
@@ -195,13 +276,14 @@ def driver_registration_page():
                     'route': route,
                     'max_capacity': max_capacity,
                     'current_capacity': 0,
-                    'photo': image_b64,
                     'location': [starting_lat, starting_lon]
                 }
                 
                 driver_id = db.add_driver(driver_data)
                 
                 if driver_id:
+                    # Resizing and encoding happen in the background; the photo shows up once they finish
+                    photos.submit_driver_photo(driver_id, photo.getvalue())
                     driver_data['id'] = driver_id
                     st.session_state.user_data = driver_data
                     st.session_state.user_registered = True
@@ -261,18 +343,52 @@ def commuter_registration_page():
         st.session_state.show_login = True
         st.rerun()
 
+def prepare_trip_analytics(driver_id):
+    import pandas as pd
+    
+    if not db.has_trips(driver_id):
+        return None
+    
+    daily_trips = db.get_daily_trip_columns(driver_id, as_frame=True)
+    if daily_trips.empty:
+        return {'completed': False}
+    
+    daily_trips['date'] = pd.to_datetime(daily_trips['date']).dt.date
+    
+    distance_bins = pd.DataFrame(db.get_trip_distance_histogram(driver_id))
+    distance_bins['distance'] = (distance_bins['bin_start_km'] + distance_bins['bin_end_km']) / 2
+    
+    trip_table = []
+    for trip in db.get_recent_trips(driver_id):
+        trip_table.append({
+            'Date': trip['start_time'][:10],
+            'Start Time': trip['start_time'][11:19],
+            'End Time': trip['end_time'][11:19] if trip['end_time'] else 'N/A',
+            'Distance (km)': f"{trip['distance']:.2f}",
+            'Passengers': trip['passengers'],
+            'Route': trip['route']
+        })
+    
+    return {
+        'completed': True,
+        'daily_trips': daily_trips,
+        'distance_bins': distance_bins[['distance', 'trips']],
+        'recent_trips': pd.DataFrame(trip_table)
+    }
+
+@metrics.timed("page.trip_analytics_dashboard")
 def trip_analytics_dashboard():
+    import plotly.express as px
+    
     st.markdown("## 📊 Trip Analytics Dashboard")
     
     driver = st.session_state.user_data
-    trips = db.get_driver_trips(driver['id'])
+    analytics = prepare_trip_analytics(driver['id'])
     
-    if not trips:
+    if analytics is None:
         st.info("No trip history yet. Start driving to see your analytics!")
         return
     
-    completed_trips = [t for t in trips if t['status'] == 'completed']
-    
     col1, col2, col3, col4 = st.columns(4)
     with col1:
         st.metric("Total Trips", driver.get('total_trips', 0))
@@ -286,55 +402,42 @@ def trip_analytics_dashboard():
     
     st.markdown("---")
     
-    if completed_trips:
-        df_trips = pd.DataFrame(completed_trips)
-        df_trips['start_time'] = pd.to_datetime(df_trips['start_time'])
-        df_trips['date'] = df_trips['start_time'].dt.date
-        
+    if analytics['completed']:
         col_chart1, col_chart2 = st.columns(2)
         
         with col_chart1:
             st.markdown("### 📈 Trips Over Time")
-            daily_trips = df_trips.groupby('date').size().reset_index(name='trips')
-            fig = px.line(daily_trips, x='date', y='trips', markers=True, 
-                         title="Daily Trip Count", labels={'date': 'Date', 'trips': 'Number of Trips'})
-            fig.update_layout(height=300)
-            st.plotly_chart(fig, use_container_width=True)
+            with metrics.timer("render.plotly.daily_trips"):
+                fig = px.line(analytics['daily_trips'], x='date', y='trips', markers=True, 
+                             title="Daily Trip Count", labels={'date': 'Date', 'trips': 'Number of Trips'})
+                fig.update_layout(height=300)
+                st.plotly_chart(fig, use_container_width=True)
         
         with col_chart2:
             st.markdown("### 🛣️ Distance Distribution")
-            fig = px.histogram(df_trips, x='distance', nbins=20,
-                              title="Trip Distance Distribution", 
-                              labels={'distance': 'Distance (km)', 'count': 'Frequency'})
-            fig.update_layout(height=300)
-            st.plotly_chart(fig, use_container_width=True)
+            with metrics.timer("render.plotly.distance_histogram"):
+                fig = px.bar(analytics['distance_bins'], x='distance', y='trips',
+                            title="Trip Distance Distribution", 
+                            labels={'distance': 'Distance (km)', 'trips': 'Frequency'})
+                fig.update_layout(height=300, bargap=0)
+                st.plotly_chart(fig, use_container_width=True)
         
         st.markdown("### 📋 Recent Trips")
-        recent_trips = completed_trips[:10]
-        trip_table = []
-        for trip in recent_trips:
-            trip_table.append({
-                'Date': trip['start_time'][:10],
-                'Start Time': trip['start_time'][11:19],
-                'End Time': trip['end_time'][11:19] if trip['end_time'] else 'N/A',
-                'Distance (km)': f"{trip['distance']:.2f}",
-                'Passengers': trip['passengers'],
-                'Route': trip['route']
-            })
-        st.dataframe(pd.DataFrame(trip_table), use_container_width=True, hide_index=True)
+        st.dataframe(analytics['recent_trips'], use_container_width=True, hide_index=True)
 
+@metrics.timed("page.driver_reviews_section")
 def driver_reviews_section():
     st.markdown("### ⭐ Reviews & Ratings")
     
     driver = st.session_state.user_data
-    reviews = db.get_driver_reviews(driver['id'])
+    summary = db.get_driver_rating_summary(driver['id'])
     
-    if not reviews:
+    if not summary['total_ratings']:
         st.info("No reviews yet. Keep providing excellent service!")
         return
     
-    avg_rating = driver.get('average_rating', 0)
-    total_reviews = len(reviews)
+    avg_rating = summary['average_rating']
+    total_reviews = summary['total_ratings']
     
     col1, col2 = st.columns([1, 3])
     with col1:
@@ -342,9 +445,7 @@ def driver_reviews_section():
         st.markdown(f"Based on {total_reviews} reviews")
     
     with col2:
-        rating_counts = {i: 0 for i in range(1, 6)}
-        for review in reviews:
-            rating_counts[review['rating']] += 1
+        rating_counts = summary['histogram']
         
         for rating in range(5, 0, -1):
             count = rating_counts[rating]
@@ -354,15 +455,25 @@ def driver_reviews_section():
     st.markdown("---")
     st.markdown("#### Recent Reviews")
     
-    for review in reviews[:5]:
-        with st.container():
-            col_rating, col_content = st.columns([1, 4])
-            with col_rating:
-                st.markdown(f"### {'⭐' * review['rating']}")
-            with col_content:
-                st.markdown(f"**{review['commuter_name']}** - {review['review_time'][:10]}")
-                st.markdown(f"_{review['comment']}_")
-            st.markdown("---")
+    pages = st.session_state.get('review_pages', 1)
+    cursor = None
+    for _ in range(pages):
+        reviews, cursor = db.get_driver_reviews_page(driver['id'], limit=REVIEWS_PER_PAGE, before=cursor)
+        for review in reviews:
+            with st.container():
+                col_rating, col_content = st.columns([1, 4])
+                with col_rating:
+                    st.markdown(f"### {'⭐' * review['rating']}")
+                with col_content:
+                    st.markdown(f"**{review['commuter_name']}** - {review['review_time'][:10]}")
+                    st.markdown(f"_{review['comment']}_")
+                st.markdown("---")
+        if cursor is None:
+            break
+    
+    if cursor is not None and st.button("Show older reviews"):
+        st.session_state.review_pages = pages + 1
+        st.rerun()
 
 def driver_dashboard():
     tab1, tab2, tab3 = st.tabs(["🚐 Dashboard", "📊 Analytics", "⭐ Reviews"])
@@ -376,7 +487,11 @@ def driver_dashboard():
     with tab3:
         driver_reviews_section()
 
+@metrics.timed("page.driver_main_dashboard")
 def driver_main_dashboard():
+    import folium
+    from streamlit_folium import st_folium
+    
     st.markdown("## 🚐 Driver Dashboard")
     
     driver = st.session_state.user_data
@@ -430,6 +545,11 @@ def driver_main_dashboard():
     with col_right:
         st.markdown("### 🛣️ Trip Management")
         
+        if st.session_state.active_trip is None:
+            active_trip = db.get_active_trip(driver['id'])
+            if active_trip:
+                st.session_state.active_trip = active_trip['id']
+        
         if st.session_state.active_trip is None:
             if st.button("🚀 Start New Trip", type="primary", use_container_width=True):
                 trip_id = db.start_trip(
@@ -446,24 +566,21 @@ def driver_main_dashboard():
             passengers = st.number_input("Passengers on this trip", min_value=0, max_value=driver['max_capacity'], value=driver['current_capacity'])
             
             if st.button("🏁 End Trip", type="secondary", use_container_width=True):
-                trips = db.get_driver_trips(driver['id'])
-                active_trip = next((t for t in trips if t['id'] == st.session_state.active_trip), None)
+                active_trip = db.get_trip(st.session_state.active_trip)
                 
-                if active_trip:
-                    distance = geodesic(
-                        (active_trip['start_lat'], active_trip['start_lon']),
-                        (driver['location'][0], driver['location'][1])
-                    ).kilometers
-                    
-                    db.end_trip(
+                if active_trip and active_trip['status'] == 'active':
+                    distance = db.end_trip(
                         st.session_state.active_trip,
                         driver['location'][0],
                         driver['location'][1],
-                        distance,
-                        passengers
+                        passengers=passengers
                     )
                     st.session_state.active_trip = None
-                    st.success(f"Trip ended! Distance: {distance:.2f} km")
+                    if distance is not None:
+                        st.success(f"Trip ended! Distance: {distance:.2f} km")
+                    st.rerun()
+                else:
+                    st.session_state.active_trip = None
                     st.rerun()
     
     st.markdown("---")
@@ -482,8 +599,10 @@ def driver_main_dashboard():
         icon=folium.Icon(color="red", icon="bus", prefix='fa')
     ).add_to(driver_map)
     
-    st_folium(driver_map, width=None, height=400)
+    with metrics.timer("render.folium.driver_map"):
+        st_folium(driver_map, width=None, height=400)
 
+@metrics.timed("page.commuter_map_view")
 def commuter_map_view():
     st.markdown("## 🗺️ Live Jeepney Tracker")
     
@@ -495,6 +614,11 @@ def commuter_map_view():
         if st.sidebar.checkbox(route, value=True, key=f"route_{route}"):
             selected_routes.append(route)
     
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### 📡 Search Area")
+    search_radius = st.sidebar.slider("Search radius (km)", min_value=1, max_value=50, value=DEFAULT_SEARCH_RADIUS_KM, key="search_radius")
+    only_with_seats = st.sidebar.checkbox("Only jeepneys with free seats", value=False, key="only_with_seats")
+    
     st.sidebar.markdown("---")
     st.sidebar.markdown("### 📍 Your Location")
     commuter_lat = st.sidebar.number_input("Latitude", value=float(commuter['location'][0]), format="%.6f", key="commuter_lat")
@@ -505,8 +629,67 @@ def commuter_map_view():
         st.success("Location updated!")
         st.rerun()
     
-    drivers = db.get_all_drivers()
-    filtered_drivers = [d for d in drivers if d['route'] in selected_routes]
+    live_updates = st.sidebar.toggle("📡 Live updates", value=True, key="live_updates")
+    if st.sidebar.button("🔄 Refresh Map", use_container_width=True):
+        st.session_state.live_feed = None
+        st.rerun()
+    
+    search = (
+        tuple(commuter['location']),
+        tuple(selected_routes),
+        1 if only_with_seats else 0,
+        search_radius
+    )
+    
+    refresh_interval = LIVE_REFRESH_SECONDS if live_updates else None
+    st.fragment(run_every=refresh_interval)(live_jeepney_panel)(commuter, search)
+
+def sync_live_drivers(search):
+    import eta
+    
+    location, routes, min_free_seats, radius_km = search
+    feed = st.session_state.get('live_feed')
+    
+    if feed is None or feed['search'] != search:
+        cursor = db.get_change_cursor()
+        drivers = db.find_nearest_drivers(
+            location[0], location[1],
+            k=None,
+            routes=list(routes),
+            min_free_seats=min_free_seats,
+            radius_km=radius_km
+        )
+        feed = {'search': search, 'cursor': cursor, 'drivers': {d['id']: d for d in drivers}}
+        st.session_state.live_feed = feed
+        return feed['drivers']
+    
+    cursor, changes = db.get_driver_changes(feed['cursor'], location[0], location[1], radius_km, feed['drivers'].keys())
+    feed['cursor'] = cursor
+    for driver in db.get_drivers_by_ids(changes.keys()):
+        distances = eta.haversine_km(location, [driver['location'][0]], [driver['location'][1]])
+        driver['distance_km'] = float(distances[0])
+        visible = (
+            driver['route'] in routes
+            and driver['max_capacity'] - driver['current_capacity'] >= min_free_seats
+            and driver['distance_km'] <= radius_km
+        )
+        if visible:
+            feed['drivers'][driver['id']] = driver
+        else:
+            feed['drivers'].pop(driver['id'], None)
+    return feed['drivers']
+
+@metrics.timed("page.live_jeepney_panel")
+def live_jeepney_panel(commuter, search):
+    import eta
+    from streamlit_folium import st_folium
+    
+    nearby = sync_live_drivers(search)
+    filtered_drivers = [dict(d) for d in nearby.values()]
+    eta.attach_etas(filtered_drivers, commuter['location'])
+    filtered_drivers.sort(key=lambda d: d['distance_km'])
+    # The map shows every match (clustered past CLUSTER_THRESHOLD); only the detail list is capped
+    listed_drivers = filtered_drivers[:MAX_NEARBY_JEEPNEYS]
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -514,62 +697,24 @@ def commuter_map_view():
     with col2:
         st.metric("🚐 Available Jeepneys", len(filtered_drivers))
     with col3:
-        st.metric("🛣️ Routes Shown", len(selected_routes))
+        st.metric("🛣️ Routes Shown", len(search[1]))
     
     st.markdown("---")
     
-    jeepney_map = folium.Map(
-        location=commuter['location'],
-        zoom_start=13,
-        tiles="OpenStreetMap"
-    )
-    
-    folium.Marker(
-        commuter['location'],
-        popup="Your Location",
-        tooltip="You are here",
-        icon=folium.Icon(color="blue", icon="user", prefix='fa')
-    ).add_to(jeepney_map)
-    
-    for driver in filtered_drivers:
-        eta_minutes, distance = calculate_eta(driver['location'], commuter['location'])
-        
-        capacity_status = f"{driver['current_capacity']}/{driver['max_capacity']}"
-        available_seats = driver['max_capacity'] - driver['current_capacity']
-        
-        rating_display = f"⭐ {driver['average_rating']:.1f}" if driver['average_rating'] > 0 else "No ratings yet"
-        
-        popup_html = f"""
-        <div style='width: 200px; font-size: 11px;'>
-            <h4 style='color: {ROUTE_COLORS[driver['route']]}; margin: 0; font-size: 14px;'>🚐 {driver['route']}</h4>
-            <hr style='margin: 3px 0;'>
-            <p style='margin: 2px 0;'><b>Driver:</b> {driver['first_name']} {driver['last_name']}</p>
-            <p style='margin: 2px 0;'><b>Plate:</b> {driver['license_plate']}</p>
-            <p style='margin: 2px 0;'><b>Rating:</b> {rating_display}</p>
-            <p style='margin: 2px 0;'><b>Seats:</b> {available_seats}/{driver['max_capacity']}</p>
-            <p style='margin: 2px 0;'><b>Distance:</b> {distance} km</p>
-            <p style='color: green; font-weight: bold; margin: 2px 0;'>⏱️ ETA: {eta_minutes} min</p>
-            <img src='data:image/png;base64,{driver['photo']}' width='180' style='border-radius: 5px; margin-top: 5px;'>
-        </div>
-        """
-        
-        icon_color = 'green' if available_seats > 0 else 'red'
-        
-        folium.Marker(
-            driver['location'],
-            popup=folium.Popup(popup_html, max_width=250),
-            tooltip=f"{driver['route']} - {driver['license_plate']} (ETA: {eta_minutes} min)",
-            icon=folium.Icon(color=icon_color, icon="bus", prefix='fa')
-        ).add_to(jeepney_map)
-    
-    st_folium(jeepney_map, width=None, height=500)
+    with metrics.timer("render.folium.commuter_map"):
+        base_map = get_commuter_base_map(commuter['location'])
+        driver_layer = build_driver_layer(filtered_drivers)
+        st_folium(base_map, feature_group_to_add=driver_layer, key="commuter_map", width=None, height=500, returned_objects=[])
+    base_map._children.pop(driver_layer.get_name(), None)
     
     st.markdown("---")
     st.markdown("### 📋 Available Jeepneys")
     
-    if filtered_drivers:
-        for driver in filtered_drivers:
-            eta_minutes, distance = calculate_eta(driver['location'], commuter['location'])
+    if listed_drivers:
+        if len(filtered_drivers) > len(listed_drivers):
+            st.caption(f"Showing the {len(listed_drivers)} nearest of {len(filtered_drivers)} jeepneys on the map")
+        for driver in listed_drivers:
+            eta_minutes, distance = driver['eta_minutes'], driver['distance_km']
             available_seats = driver['max_capacity'] - driver['current_capacity']
             
             rating_stars = f"⭐ {driver['average_rating']:.1f}/5.0 ({driver['total_ratings']} reviews)" if driver['average_rating'] > 0 else "No ratings yet"
@@ -602,12 +747,16 @@ def commuter_map_view():
                             st.rerun()
                 
                 with col_photo:
-                    st.image(f"data:image/png;base64,{driver['photo']}", caption="Driver Photo", use_container_width=True)
+                    if st.toggle("📷 Show photo", key=f"show_photo_{driver['id']}"):
+                        photo = db.get_driver_photo(driver['id'])
+                        if photo:
+                            st.image(photo, caption="Driver Photo", use_container_width=True)
+                        elif photos.is_pending(driver['id']):
+                            st.caption("Photo is still being processed")
+                        else:
+                            st.caption("No photo on file")
     else:
-        st.info("No jeepneys available for selected routes")
-    
-    if st.sidebar.button("🔄 Refresh Map", use_container_width=True):
-        st.rerun()
+        st.info("No jeepneys available for selected routes within your search radius")
 
 def main():
     init_session_state()
@@ -647,6 +796,7 @@ def main():
             st.session_state.user_registered = False
             st.session_state.user_data = {}
             st.session_state.active_trip = None
+            st.session_state.review_pages = 1
             st.session_state.show_login = True
             st.rerun()
         
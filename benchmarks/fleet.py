@@ -0,0 +1,135 @@
+import random
+from datetime import datetime, timedelta
+
+import database as db
+
+ROUTES = ["Balagtas", "Alangilan", "Balete", "Soro-soro", "Lipa"]
+BATANGAS_CENTER = (13.7565, 121.0583)
+SPREAD_DEGREES = 0.25
+
+CHUNK_SIZE = 50000
+
+PRESETS = {
+    'tiny': {'drivers': 200, 'commuters': 2000, 'trips': 10000, 'reviews': 5000, 'location_updates': 50000},
+    'small': {'drivers': 1000, 'commuters': 10000, 'trips': 100000, 'reviews': 50000, 'location_updates': 1000000},
+    'full': {'drivers': 10000, 'commuters': 100000, 'trips': 1000000, 'reviews': 500000, 'location_updates': 10000000}
+}
+
+def _chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _position(rng):
+    return (
+        BATANGAS_CENTER[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+        BATANGAS_CENTER[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES)
+    )
+
+def generate_fleet(drivers, commuters, trips, reviews, location_updates, seed=42, days=730):
+    rng = random.Random(seed)
+    now = datetime.now()
+    db.init_database()
+
+    with db.get_connection() as conn:
+        driver_rows = []
+        for i in range(drivers):
+            lat, lon = _position(rng)
+            max_capacity = rng.randint(10, 30)
+            driver_rows.append((
+                i + 1, f"Driver{i}", "Bench", f"09{i:09d}", f"N01-{i:08d}", f"BEN {i:05d}",
+                rng.choice(ROUTES), max_capacity, rng.randint(0, max_capacity), lat, lon
+            ))
+        for chunk in _chunks(driver_rows):
+            conn.executemany('''
+                INSERT INTO drivers (
+                    id, first_name, last_name, contact_number, license_number,
+                    license_plate, route, max_capacity, current_capacity, latitude, longitude
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', chunk)
+        conn.execute('''
+            INSERT INTO driver_locations (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT id, latitude, latitude, longitude, longitude FROM drivers
+        ''')
+
+        def commuter_rows():
+            for i in range(commuters):
+                lat, lon = _position(rng)
+                yield (i + 1, f"Commuter{i}", "Bench", f"08{i:09d}", "", lat, lon)
+        for chunk in _chunks(commuter_rows()):
+            conn.executemany('''
+                INSERT INTO commuters (id, first_name, last_name, contact_number, email, latitude, longitude)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', chunk)
+
+        def trip_rows():
+            for _ in range(trips):
+                driver = driver_rows[rng.randrange(drivers)]
+                start = now - timedelta(days=rng.uniform(0, days))
+                end = start + timedelta(minutes=rng.uniform(10, 90))
+                distance = rng.uniform(1, 25)
+                yield (
+                    driver[0], str(start), str(end), driver[9], driver[10], driver[9], driver[10],
+                    distance, rng.randint(0, driver[7]), driver[6], 'completed', distance
+                )
+        for chunk in _chunks(trip_rows()):
+            conn.executemany('''
+                INSERT INTO trips (
+                    driver_id, start_time, end_time, start_lat, start_lon, end_lat, end_lon,
+                    distance, passengers, route, status, path_distance
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', chunk)
+
+        def review_rows():
+            for _ in range(reviews):
+                review_time = now - timedelta(days=rng.uniform(0, days))
+                yield (
+                    rng.randint(1, drivers), rng.randint(1, max(commuters, 1)), rng.randint(1, 5),
+                    "Synthetic review", review_time.strftime('%Y-%m-%d %H:%M:%S')
+                )
+        for chunk in _chunks(review_rows()):
+            conn.executemany('''
+                INSERT INTO reviews (driver_id, commuter_id, rating, comment, review_time)
+                VALUES (?, ?, ?, ?, ?)
+            ''', chunk)
+
+        def location_rows():
+            for _ in range(location_updates):
+                driver = driver_rows[rng.randrange(drivers)]
+                update_time = now - timedelta(seconds=rng.uniform(0, days * 86400))
+                yield (
+                    driver[0],
+                    driver[9] + rng.uniform(-0.01, 0.01),
+                    driver[10] + rng.uniform(-0.01, 0.01),
+                    update_time.strftime('%Y-%m-%d %H:%M:%S')
+                )
+        for chunk in _chunks(location_rows()):
+            conn.executemany('''
+                INSERT INTO location_updates (driver_id, latitude, longitude, update_time)
+                VALUES (?, ?, ?, ?)
+            ''', chunk)
+
+        _rebuild_aggregates(conn)
+
+    return {
+        'drivers': drivers,
+        'commuters': commuters,
+        'trips': trips,
+        'reviews': reviews,
+        'location_updates': location_updates
+    }
+
+def _rebuild_aggregates(conn):
+    conn.execute('''
+        UPDATE drivers SET
+            total_trips = (SELECT COUNT(*) FROM trips WHERE driver_id = drivers.id),
+            total_distance = COALESCE((SELECT SUM(distance) FROM trips WHERE driver_id = drivers.id), 0.0)
+    ''')
+    db._migrate_rating_stats(conn)
+    db._rebuild_trip_rollups(conn)
+    conn.execute('ANALYZE')
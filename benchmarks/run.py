@@ -0,0 +1,185 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), "jeeptrack-bench.db")
+DEFAULT_REPEAT = 20
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+def _summarize(samples):
+    samples = [s * 1000 for s in samples]
+    return {
+        'runs': len(samples),
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(_percentile(samples, 0.95), 3),
+        'mean_ms': round(statistics.fmean(samples), 3)
+    }
+
+def _time(func, repeat, setup=None):
+    samples = []
+    for i in range(repeat):
+        args = setup(i) if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return _summarize(samples)
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _import_app():
+    # app.py calls Streamlit at import time; outside `streamlit run` that only logs warnings
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        import app
+    return app
+
+def run_scenarios(repeat, seed=7):
+    import database as db
+    import eta
+    import folium
+    app = _import_app()
+    
+    rng = random.Random(seed)
+    with db.get_connection() as conn:
+        driver_ids = [row[0] for row in conn.execute('SELECT id FROM drivers')]
+        commuter_ids = [row[0] for row in conn.execute('SELECT id FROM commuters LIMIT 1000')]
+        busiest = conn.execute('''
+            SELECT driver_id FROM trips GROUP BY driver_id ORDER BY COUNT(*) DESC LIMIT 1
+        ''').fetchone()
+    busiest = busiest[0] if busiest else driver_ids[0]
+    
+    def random_point(_):
+        return (app.BATANGAS_CENTER[0] + rng.uniform(-0.1, 0.1), app.BATANGAS_CENTER[1] + rng.uniform(-0.1, 0.1))
+    
+    def cold(_):
+        db.clear_read_cache()
+        return ()
+    
+    results = {}
+    
+    results['add_review'] = _time(
+        db.add_review, repeat,
+        lambda i: (rng.choice(driver_ids), rng.choice(commuter_ids) if commuter_ids else 1, rng.randint(1, 5), "Benchmark review")
+    )
+    
+    def start_trip(_):
+        driver = db.get_drivers_by_ids([rng.choice(driver_ids)])[0]
+        trip_id = db.start_trip(driver['id'], driver['location'][0], driver['location'][1], driver['route'])
+        return (trip_id, driver['location'][0] + 0.01, driver['location'][1] + 0.01)
+    results['end_trip'] = _time(lambda trip_id, lat, lon: db.end_trip(trip_id, lat, lon, passengers=5), repeat, start_trip)
+    
+    results['get_all_drivers_cold'] = _time(db.get_all_drivers, repeat, cold)
+    results['get_all_drivers_warm'] = _time(db.get_all_drivers, repeat)
+    results['get_driver_trips_cold'] = _time(lambda: db.get_driver_trips(busiest), repeat, cold)
+    results['get_driver_trips_page_cold'] = _time(lambda: db.get_driver_trips_page(busiest), repeat, cold)
+    results['get_driver_reviews_page_cold'] = _time(lambda: db.get_driver_reviews_page(busiest), repeat, cold)
+    
+    results['find_nearest_drivers_cold'] = _time(
+        lambda lat, lon: db.find_nearest_drivers(lat, lon, k=None, routes=app.ROUTES, radius_km=app.DEFAULT_SEARCH_RADIUS_KM),
+        repeat, lambda i: (cold(i), random_point(i))[1]
+    )
+    
+    results['find_nearest_drivers_top10_cold'] = _time(
+        lambda lat, lon: db.find_nearest_drivers(lat, lon, k=10, routes=app.ROUTES, radius_km=app.DEFAULT_SEARCH_RADIUS_KM),
+        repeat, lambda i: (cold(i), random_point(i))[1]
+    )
+    results['get_driver_columns_cold'] = _time(db.get_driver_columns, repeat, cold)
+    
+    def build_commuter_map(lat, lon):
+        drivers = db.find_nearest_drivers(lat, lon, k=None, routes=app.ROUTES, radius_km=app.DEFAULT_SEARCH_RADIUS_KM)
+        eta.attach_etas(drivers, (lat, lon))
+        base_map = folium.Map(location=[lat, lon], zoom_start=13)
+        app.build_driver_layer(drivers).add_to(base_map)
+        return base_map.get_root().render()
+    results['commuter_map_build'] = _time(build_commuter_map, repeat, lambda i: (cold(i), random_point(i))[1])
+    
+    results['trip_analytics_prep_cold'] = _time(lambda: app.prepare_trip_analytics(busiest), repeat, cold)
+    
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="JeepTrack PH benchmark suite")
+    parser.add_argument("--preset", choices=["tiny", "small", "full"], default="tiny")
+    parser.add_argument("--drivers", type=int)
+    parser.add_argument("--commuters", type=int)
+    parser.add_argument("--trips", type=int)
+    parser.add_argument("--reviews", type=int)
+    parser.add_argument("--location-updates", type=int)
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="benchmark database path (recreated unless --reuse)")
+    parser.add_argument("--reuse", action="store_true", help="run against an existing benchmark database")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report to this path")
+    args = parser.parse_args()
+    
+    # The database module reads its path at import time, so point it at the bench DB first
+    os.environ["JEEPTRACK_DB_PATH"] = args.db
+    # Compaction deletes and vacuums rows, which would land inside the timed scenarios
+    os.environ["JEEPTRACK_BACKGROUND_COMPACTION"] = "0"
+    from benchmarks import fleet
+    
+    sizes = dict(fleet.PRESETS[args.preset])
+    for key in sizes:
+        value = getattr(args, key)
+        if value is not None:
+            sizes[key] = value
+    
+    if not args.reuse:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+        start = time.perf_counter()
+        fleet.generate_fleet(seed=args.seed, **sizes)
+        print(f"Generated fleet {sizes} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    
+    results = run_scenarios(args.repeat)
+    
+    report = {
+        'revision': _git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'fleet': sizes,
+        'repeat': args.repeat,
+        'results': results
+    }
+    
+    for name, stats in results.items():
+        print(f"{name:<28} median {stats['median_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
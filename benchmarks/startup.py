@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from benchmarks.run import _git_revision, _summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), "jeeptrack-startup.db")
+DEFAULT_REPEAT = 5
+
+HEAVY_MODULES = ("folium", "streamlit_folium", "pandas", "PIL", "plotly", "numpy")
+IMPORT_MODULES = ("streamlit", "folium", "streamlit_folium", "pandas", "PIL.Image", "plotly.express", "numpy", "database", "metrics")
+
+# Each probe runs in a fresh interpreter and prints the elapsed seconds and the heavy modules it loaded as JSON
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps([time.perf_counter() - start, sorted(m for m in {heavy!r} if m in sys.modules)]))
+"""
+
+APP_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from benchmarks.run import _import_app
+_import_app()
+print(json.dumps([time.perf_counter() - start, sorted(m for m in {heavy!r} if m in sys.modules)]))
+"""
+
+FIRST_RUN_PROBE = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file({app_path!r}, default_timeout=120)
+at.run()
+print(json.dumps([time.perf_counter() - start, sorted(m for m in {heavy!r} if m in sys.modules)]))
+"""
+
+def _probe(source, env, repeat):
+    samples = []
+    loaded = []
+    # The first run warms the OS file cache and migrates the database; it is not counted
+    for i in range(repeat + 1):
+        result = subprocess.run(
+            [sys.executable, "-c", source],
+            capture_output=True, text=True, check=True, cwd=ROOT, env=env
+        )
+        elapsed, loaded = json.loads(result.stdout.strip().splitlines()[-1])
+        if i:
+            samples.append(elapsed)
+    return dict(_summarize(samples), heavy_modules_loaded=loaded)
+
+def run_scenarios(db_path, repeat):
+    env = dict(os.environ, JEEPTRACK_DB_PATH=db_path, JEEPTRACK_BACKGROUND_COMPACTION="0", PYTHONPATH=ROOT)
+    env.pop("JEEPTRACK_METRICS", None)
+    
+    results = {}
+    for module in IMPORT_MODULES:
+        results[f"import {module}"] = _probe(IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES), env, repeat)
+    results["import app"] = _probe(APP_IMPORT_PROBE.format(heavy=HEAVY_MODULES), env, repeat)
+    results["first run role_selection_page"] = _probe(
+        FIRST_RUN_PROBE.format(app_path=os.path.join(ROOT, "app.py"), heavy=HEAVY_MODULES), env, repeat
+    )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="JeepTrack PH cold start benchmark")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="database path used by the app under test")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="fresh interpreters per scenario")
+    parser.add_argument("--output", help="write the JSON report to this path")
+    args = parser.parse_args()
+    
+    results = run_scenarios(args.db, args.repeat)
+    
+    report = {
+        'revision': _git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'results': results
+    }
+    
+    for name, stats in results.items():
+        loaded = ', '.join(stats['heavy_modules_loaded']) or '-'
+        print(f"{name:<32} median {stats['median_ms']:>10.3f} ms   loads {loaded}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,571 @@
 import sqlite3
+import atexit
+import base64
+import functools
+import hashlib
+import heapq
+import itertools
 import json
-from datetime import datetime
+import math
+import queue
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 import os
 
-DB_PATH = "jeeptrack.db"
+DB_PATH = os.environ.get("JEEPTRACK_DB_PATH", "jeeptrack.db")
+
+POOL_SIZE = 8
+
+# Optional single writer thread: writes are queued and applied in batched transactions
+WRITER_QUEUE_ENABLED = os.environ.get("JEEPTRACK_WRITER_QUEUE", "").lower() in ("1", "true", "yes", "on")
+WRITER_QUEUE_SIZE = 10000
+WRITER_BATCH_SIZE = 200
+# BEGIN IMMEDIATE attempts (each waits up to BUSY_TIMEOUT_MS) before a batch's callers see "database is locked"
+WRITER_LOCK_ATTEMPTS = 3
+
+# Optional read-only snapshot for analytics and history reads; 0 disables it. Reads fall back to
+# the live database whenever the snapshot is older than SNAPSHOT_MAX_AGE seconds
+SNAPSHOT_MAX_AGE = float(os.environ.get("JEEPTRACK_SNAPSHOT_MAX_AGE", "0") or 0)
+SNAPSHOT_PATH = os.environ.get("JEEPTRACK_SNAPSHOT_PATH")
+# Only the tables replica reads touch are copied, never the location history
+SNAPSHOT_TABLES = ('trips', 'trip_daily_rollup', 'trip_distance_bins', 'reviews', 'driver_rating_stats', 'commuters')
+# The refresher stops after this long without a replica read and restarts on the next one
+SNAPSHOT_IDLE_SECONDS = 600
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+CACHE_SIZE_KB = 16384
+MMAP_SIZE = 64 * 1024 * 1024
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+DRIVER_COLUMNS = (
+    'id', 'first_name', 'last_name', 'contact_number', 'license_number',
+    'license_plate', 'route', 'max_capacity', 'current_capacity',
+    'latitude', 'longitude', 'registration_time', 'total_trips',
+    'total_distance', 'average_rating', 'total_ratings'
+)
+_DRIVER_SELECT = ', '.join(DRIVER_COLUMNS)
+_DRIVER_SELECT_D = ', '.join(f'd.{column}' for column in DRIVER_COLUMNS)
+
+TRIP_COLUMNS = (
+    'id', 'driver_id', 'start_time', 'end_time', 'start_lat', 'start_lon',
+    'end_lat', 'end_lon', 'distance', 'passengers', 'route', 'status',
+    'path_distance'
+)
+_TRIP_SELECT = ', '.join(TRIP_COLUMNS)
+
+REVIEW_COLUMNS = ('id', 'driver_id', 'commuter_id', 'rating', 'comment', 'review_time')
+
+LOCATION_FLUSH_SIZE = 500
+LOCATION_FLUSH_INTERVAL = 2.0
+
+READ_CACHE_SIZE = 1024
+
+COLUMNAR_CHUNK_ROWS = 4096
+DRIVER_ID_BATCH = 500
+# NumPy dtypes for numeric columns in columnar fetches; anything else is kept as an object array
+COLUMN_DTYPES = {
+    'id': 'int64',
+    'driver_id': 'int64',
+    'commuter_id': 'int64',
+    'max_capacity': 'int64',
+    'current_capacity': 'int64',
+    'total_trips': 'int64',
+    'total_ratings': 'int64',
+    'rating': 'int64',
+    'passengers': 'int64',
+    'trips': 'int64',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'start_lat': 'float64',
+    'start_lon': 'float64',
+    'end_lat': 'float64',
+    'end_lon': 'float64',
+    'distance': 'float64',
+    'path_distance': 'float64',
+    'total_distance': 'float64',
+    'average_rating': 'float64'
+}
+
+# Public helpers that metrics.instrument_module should leave alone (context managers, lifecycle hooks)
+UNINSTRUMENTED = ('get_connection', 'close_connections', 'database_ready', 'clear_read_cache')
+
+# location_updates keeps every ping for LOCATION_FULL_RESOLUTION_DAYS, one ping per driver per
+# LOCATION_DOWNSAMPLE_SECONDS after that, and nothing older than LOCATION_RETENTION_DAYS
+LOCATION_FULL_RESOLUTION_DAYS = 7
+LOCATION_DOWNSAMPLE_SECONDS = 60
+LOCATION_RETENTION_DAYS = 365
+COMPACTION_BATCH_SIZE = 5000
+COMPACTION_PAUSE = 0.05
+COMPACTION_INTERVAL = 3600.0
+# Set to 0 to keep the app from compacting in-process (benchmarks do); run `python maintenance.py compact --loop` instead
+BACKGROUND_COMPACTION = os.environ.get("JEEPTRACK_BACKGROUND_COMPACTION", "1").lower() not in ("0", "false", "no", "off")
+VACUUM_PAGES_PER_RUN = 2000
+
+# Optional compact track store: "on" appends pings to location_tracks as well as location_updates,
+# "only" stores them in location_tracks alone
+TRACK_STORE_MODE = os.environ.get("JEEPTRACK_TRACK_STORE", "off").lower()
+TRACK_BUCKET_SECONDS = 3600
+TRACK_COORD_SCALE = 1000000
+TRACK_READ_BUCKETS = 24
+
+# "route" moves location_updates into one SQLite file per route (jeeptrack.locations.<route>.db)
+LOCATION_SHARDING = os.environ.get("JEEPTRACK_LOCATION_SHARDING", "off").lower()
+MAX_ATTACHED_SHARDS = 8
+
+DISTANCE_BIN_KM = 1.0
+RECENT_TRIPS_LIMIT = 10
+TRIP_PAGE_SIZE = 50
+REVIEW_PAGE_SIZE = 20
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_pool_lock = threading.Lock()
+_pool_path = None
+
+_init_lock = threading.Lock()
+_initialized_path = None
+
+_cache_lock = threading.Lock()
+_read_cache = OrderedDict()
+_version_conn = None
+_version_conn_path = None
+_seen_data_version = None
+_table_versions = {}
+
+_location_lock = threading.Lock()
+_location_flush_lock = threading.Lock()
+_latest_locations = {}
+_pending_location_rows = []
+_last_location_flush = time.monotonic()
+_location_flusher = None
+_compactor = None
+_writer = None
+_writer_lock = threading.Lock()
+_writer_queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+_snapshot_lock = threading.Lock()
+_snapshot = {'db_path': None, 'generation': 0, 'taken': None, 'last_read': None}
+_snapshot_refresher = None
+_replica_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_shard_lock = threading.Lock()
+_shard_connections = {}
+_compaction_lock = threading.Lock()
+
+def _open_connection(path=None):
+    conn = sqlite3.connect(
+        path or DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=CACHED_STATEMENTS
+    )
+    if not conn.execute('PRAGMA page_count').fetchone()[0]:
+        # Free on a brand new file, and only before WAL mode is set; existing databases
+        # switch with enable_incremental_vacuum()
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+def _acquire_connection():
+    global _pool_path
+    with _pool_lock:
+        if _pool_path != DB_PATH:
+            _drain_pool()
+            _pool_path = DB_PATH
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        return _open_connection()
+
+def _release_connection(conn):
+    if _pool_path != DB_PATH:
+        conn.close()
+        return
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+def _drain_pool():
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+@contextmanager
+def get_connection():
+    conn = _acquire_connection()
+    try:
+        with conn:
+            yield conn
+    finally:
+        if conn.in_transaction:
+            conn.close()
+        else:
+            _release_connection(conn)
+
+def close_connections():
+    with _pool_lock:
+        _drain_pool()
+
+def _run_write(tx, *args, **kwargs):
+    if WRITER_QUEUE_ENABLED and threading.current_thread() is not _writer:
+        return _submit_write(tx, args, kwargs).result()
+    with get_connection() as conn:
+        return tx(conn, *args, **kwargs)
+
+def _submit_write(tx, args, kwargs):
+    start_writer()
+    future = Future()
+    _writer_queue.put((tx, args, kwargs, future))
+    return future
+
+def submit_write(operation, *args, **kwargs):
+    name = getattr(operation, '__name__', operation)
+    tx = _WRITE_TRANSACTIONS[name]
+    if name in ('start_trip', 'end_trip'):
+        flush_location_updates()
+    if not WRITER_QUEUE_ENABLED:
+        future = Future()
+        try:
+            future.set_result(_run_write(tx, *args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _submit_write(tx, args, kwargs)
+
+def start_writer():
+    global _writer
+    
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, args=(_open_connection(),), name="db-writer", daemon=True)
+            _writer.start()
+            atexit.register(stop_writer)
+
+def stop_writer():
+    global _writer
+    
+    with _writer_lock:
+        writer = _writer
+        if writer is None:
+            return
+        _writer_queue.put(None)
+        writer.join()
+        _writer = None
+
+def _writer_loop(conn):
+    try:
+        while True:
+            item = _writer_queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            while len(batch) < WRITER_BATCH_SIZE:
+                try:
+                    item = _writer_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            _apply_write_batch(conn, batch)
+            if stopping:
+                return
+    finally:
+        conn.close()
+
+def _begin_immediate(conn):
+    for attempt in range(WRITER_LOCK_ATTEMPTS):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            return
+        except sqlite3.OperationalError as e:
+            if attempt == WRITER_LOCK_ATTEMPTS - 1 or 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+
+def _apply_write_batch(conn, batch):
+    done = []
+    try:
+        _begin_immediate(conn)
+        for tx, args, kwargs, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            # Each operation gets a savepoint so one failure does not roll back the rest of the batch
+            conn.execute('SAVEPOINT write_op')
+            try:
+                result = tx(conn, *args, **kwargs)
+            except Exception as e:
+                conn.execute('ROLLBACK TO write_op')
+                conn.execute('RELEASE write_op')
+                future.set_exception(e)
+                continue
+            conn.execute('RELEASE write_op')
+            done.append((future, result))
+        conn.commit()
+    except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
+        for _, _, _, future in batch:
+            if future.running() or (not future.done() and future.set_running_or_notify_cancel()):
+                future.set_exception(e)
+        return
+    
+    for future, result in done:
+        future.set_result(result)
+
+def _snapshot_path():
+    return SNAPSHOT_PATH or DB_PATH + '.snapshot'
+
+def refresh_snapshot():
+    path = _snapshot_path()
+    staging = path + '.tmp'
+    if os.path.exists(staging):
+        os.remove(staging)
+    taken = time.monotonic()
+    
+    # One read transaction on the live file covers every table, so the copy is consistent and
+    # never blocks writers; indexes are built after the rows are in
+    target = sqlite3.connect(staging, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    try:
+        target.execute('ATTACH DATABASE ? AS live', ('file:' + urllib.parse.quote(os.path.abspath(DB_PATH)) + '?mode=ro',))
+        target.execute('BEGIN')
+        indexes = []
+        for table in SNAPSHOT_TABLES:
+            for kind, sql in target.execute('''
+                SELECT type, sql FROM live.sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL
+            ''', (table,)).fetchall():
+                if kind == 'table':
+                    target.execute(sql)
+                elif kind == 'index':
+                    indexes.append(sql)
+            target.execute(f'INSERT INTO main.{table} SELECT * FROM live.{table}')
+        for sql in indexes:
+            target.execute(sql)
+        target.execute('COMMIT')
+        target.execute('DETACH DATABASE live')
+    finally:
+        target.close()
+    os.replace(staging, path)
+    
+    with _snapshot_lock:
+        _snapshot['db_path'] = DB_PATH
+        _snapshot['generation'] += 1
+        _snapshot['taken'] = taken
+    return path
+
+def _fresh_snapshot_generation():
+    if not SNAPSHOT_MAX_AGE:
+        return None
+    with _snapshot_lock:
+        _snapshot['last_read'] = time.monotonic()
+    _start_snapshot_refresher()
+    
+    with _snapshot_lock:
+        if _snapshot['db_path'] != DB_PATH or _snapshot['taken'] is None:
+            return None
+        if time.monotonic() - _snapshot['taken'] > SNAPSHOT_MAX_AGE:
+            return None
+        return _snapshot['generation']
+
+def _start_snapshot_refresher():
+    global _snapshot_refresher
+    
+    if _snapshot_refresher is not None:
+        return
+    with _snapshot_lock:
+        if _snapshot_refresher is None:
+            _snapshot_refresher = threading.Thread(target=_snapshot_loop, name="snapshot-refresher", daemon=True)
+            _snapshot_refresher.start()
+
+def _snapshot_loop():
+    global _snapshot_refresher
+    
+    while True:
+        try:
+            refresh_snapshot()
+        except (sqlite3.Error, OSError):
+            pass
+        time.sleep(SNAPSHOT_MAX_AGE / 2)
+        
+        # Checked under the lock a reader takes before starting a refresher, so a read either keeps
+        # this thread alive or starts a new one
+        with _snapshot_lock:
+            if time.monotonic() - _snapshot['last_read'] > SNAPSHOT_IDLE_SECONDS:
+                _snapshot_refresher = None
+                return
+
+@contextmanager
+def _replica_connection(generation):
+    conn = None
+    try:
+        conn_generation, conn = _replica_pool.get_nowait()
+        if conn_generation != generation:
+            conn.close()
+            conn = None
+    except queue.Empty:
+        pass
+    if conn is None:
+        uri = 'file:' + urllib.parse.quote(os.path.abspath(_snapshot_path())) + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    
+    try:
+        yield conn
+    finally:
+        try:
+            _replica_pool.put_nowait((generation, conn))
+        except queue.Full:
+            conn.close()
+
+def _read_source(tables, replica):
+    generation = _fresh_snapshot_generation() if replica else None
+    if generation is not None:
+        return 'snapshot', generation, lambda: _replica_connection(generation)
+    return 'primary', _current_versions(tables), get_connection
+
+def _current_versions(tables):
+    global _version_conn, _version_conn_path, _seen_data_version, _table_versions
+    
+    with _cache_lock:
+        if _version_conn is None or _version_conn_path != DB_PATH:
+            if _version_conn is not None:
+                _version_conn.close()
+            _version_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+            _version_conn_path = DB_PATH
+            _seen_data_version = None
+            _read_cache.clear()
+        
+        data_version = _version_conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != _seen_data_version:
+            _table_versions = dict(_version_conn.execute('SELECT table_name, version FROM data_versions'))
+            _seen_data_version = data_version
+        return tuple(_table_versions.get(table, 0) for table in tables)
+
+def _cached_fetch(tables, query, params=(), one=False, replica=False):
+    source, stamp, connect = _read_source(tables, replica)
+    key = (source, query, tuple(params), one)
+    
+    with _cache_lock:
+        entry = _read_cache.get(key)
+        if entry is not None and entry[0] == stamp:
+            _read_cache.move_to_end(key)
+            return entry[1] if one else list(entry[1])
+    
+    with connect() as conn:
+        cursor = conn.execute(query, params)
+        result = cursor.fetchone() if one else cursor.fetchall()
+    
+    with _cache_lock:
+        _read_cache[key] = (stamp, result)
+        _read_cache.move_to_end(key)
+        while len(_read_cache) > READ_CACHE_SIZE:
+            _read_cache.popitem(last=False)
+    return result if one else list(result)
+
+def _columns_from_cursor(cursor):
+    import numpy as np
+    
+    names = [description[0] for description in cursor.description]
+    chunks = [[] for _ in names]
+    while True:
+        rows = cursor.fetchmany(COLUMNAR_CHUNK_ROWS)
+        if not rows:
+            break
+        for chunk, name, values in zip(chunks, names, zip(*rows)):
+            chunk.append(np.array(values, dtype=COLUMN_DTYPES.get(name, object)))
+    
+    columns = {}
+    for name, chunk in zip(names, chunks):
+        array = np.concatenate(chunk) if chunk else np.empty(0, dtype=COLUMN_DTYPES.get(name, object))
+        # Cached arrays are shared between callers
+        array.flags.writeable = False
+        columns[name] = array
+    return columns
+
+def _cached_columns(tables, query, params=(), replica=False):
+    source, stamp, connect = _read_source(tables, replica)
+    key = (source, 'columns', query, tuple(params))
+    
+    with _cache_lock:
+        entry = _read_cache.get(key)
+        if entry is not None and entry[0] == stamp:
+            _read_cache.move_to_end(key)
+            return dict(entry[1])
+    
+    with connect() as conn:
+        result = _columns_from_cursor(conn.execute(query, params))
+    
+    with _cache_lock:
+        _read_cache[key] = (stamp, result)
+        _read_cache.move_to_end(key)
+        while len(_read_cache) > READ_CACHE_SIZE:
+            _read_cache.popitem(last=False)
+    return dict(result)
+
+def _project(columns, allowed):
+    columns = list(columns)
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    return columns
+
+def _to_frame(columns):
+    import pandas as pd
+    return pd.DataFrame(columns)
+
+def _touch(conn, *tables):
+    conn.executemany('''
+        INSERT INTO data_versions (table_name, version) VALUES (?, 1)
+        ON CONFLICT (table_name) DO UPDATE SET version = version + 1
+    ''', [(table,) for table in tables])
+
+def clear_read_cache():
+    with _cache_lock:
+        _read_cache.clear()
+
+def database_ready():
+    return _initialized_path == DB_PATH
 
 def init_database():
-    conn = sqlite3.connect(DB_PATH)
+    global _initialized_path
+    
+    if database_ready():
+        return
+    
+    with _init_lock:
+        if database_ready():
+            return
+        
+        with get_connection() as conn:
+            while True:
+                conn.execute('BEGIN IMMEDIATE')
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version >= SCHEMA_VERSION:
+                    conn.commit()
+                    break
+                
+                MIGRATIONS[version](conn)
+                conn.execute(f'PRAGMA user_version = {version + 1}')
+                conn.commit()
+        
+        _initialized_path = DB_PATH
+
+def _migrate_base_schema(conn):
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -85,47 +644,344 @@ def init_database():
             FOREIGN KEY (driver_id) REFERENCES drivers(id)
         )
     ''')
+
+def _migrate_photo_store(conn):
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS photos (
+            hash TEXT PRIMARY KEY,
+            mime_type TEXT NOT NULL,
+            data BLOB NOT NULL
+        )
+    ''')
     
-    conn.commit()
-    conn.close()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS driver_photos (
+            driver_id INTEGER NOT NULL,
+            variant TEXT NOT NULL DEFAULT 'profile',
+            photo_hash TEXT NOT NULL,
+            PRIMARY KEY (driver_id, variant),
+            FOREIGN KEY (driver_id) REFERENCES drivers(id),
+            FOREIGN KEY (photo_hash) REFERENCES photos(hash)
+        )
+    ''')
+    
+    _move_inline_photos(conn)
 
-def add_driver(driver_data):
-    conn = sqlite3.connect(DB_PATH)
+def _migrate_spatial_index(conn):
     cursor = conn.cursor()
     
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS driver_locations USING rtree(
+            id,
+            min_lat, max_lat,
+            min_lon, max_lon
+        )
+    ''')
+    
+    cursor.execute('''
+        INSERT INTO driver_locations (id, min_lat, max_lat, min_lon, max_lon)
+        SELECT id, latitude, latitude, longitude, longitude FROM drivers
+        WHERE id NOT IN (SELECT id FROM driver_locations)
+    ''')
+
+def _migrate_lookup_indexes(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trips_driver_start ON trips (driver_id, start_time)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trips_driver_status ON trips (driver_id, status)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reviews_driver_time ON reviews (driver_id, review_time)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_commuters_contact ON commuters (contact_number)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_location_updates_driver_time ON location_updates (driver_id, update_time)')
+    conn.execute('ANALYZE')
+
+def _migrate_rating_stats(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS driver_rating_stats (
+            driver_id INTEGER PRIMARY KEY,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            stars_1 INTEGER NOT NULL DEFAULT 0,
+            stars_2 INTEGER NOT NULL DEFAULT 0,
+            stars_3 INTEGER NOT NULL DEFAULT 0,
+            stars_4 INTEGER NOT NULL DEFAULT 0,
+            stars_5 INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (driver_id) REFERENCES drivers(id)
+        )
+    ''')
+    
+    conn.execute('''
+        INSERT OR REPLACE INTO driver_rating_stats (
+            driver_id, rating_sum, rating_count,
+            stars_1, stars_2, stars_3, stars_4, stars_5
+        )
+        SELECT driver_id, SUM(rating), COUNT(*),
+               SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+        FROM reviews GROUP BY driver_id
+    ''')
+    
+    conn.execute('''
+        UPDATE drivers SET
+            average_rating = (SELECT CAST(rating_sum AS REAL) / rating_count FROM driver_rating_stats WHERE driver_id = drivers.id),
+            total_ratings = (SELECT rating_count FROM driver_rating_stats WHERE driver_id = drivers.id)
+        WHERE id IN (SELECT driver_id FROM driver_rating_stats)
+    ''')
+
+def _migrate_trip_path_tracking(conn):
+    _add_column(conn, 'trips', 'path_distance', 'REAL DEFAULT 0.0')
+    _add_column(conn, 'trips', 'last_lat', 'REAL')
+    _add_column(conn, 'trips', 'last_lon', 'REAL')
+    
+    conn.execute('''
+        UPDATE trips SET last_lat = start_lat, last_lon = start_lon
+        WHERE status = 'active' AND last_lat IS NULL
+    ''')
+
+def _add_column(conn, table, column, declaration):
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+def _migrate_data_versions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+def _migrate_change_feed(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS driver_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            driver_id INTEGER NOT NULL,
+            change_type TEXT NOT NULL,
+            change_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _migrate_trip_rollups(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trip_daily_rollup (
+            driver_id INTEGER NOT NULL,
+            trip_date TEXT NOT NULL,
+            trip_count INTEGER NOT NULL DEFAULT 0,
+            total_distance REAL NOT NULL DEFAULT 0.0,
+            total_passengers INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (driver_id, trip_date),
+            FOREIGN KEY (driver_id) REFERENCES drivers(id)
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trip_distance_bins (
+            driver_id INTEGER NOT NULL,
+            bin INTEGER NOT NULL,
+            trip_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (driver_id, bin),
+            FOREIGN KEY (driver_id) REFERENCES drivers(id)
+        )
+    ''')
+    
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trips_driver_status_start ON trips (driver_id, status, start_time)')
+    _rebuild_trip_rollups(conn)
+
+def _rebuild_trip_rollups(conn):
+    conn.execute('DELETE FROM trip_daily_rollup')
+    conn.execute('''
+        INSERT INTO trip_daily_rollup (driver_id, trip_date, trip_count, total_distance, total_passengers)
+        SELECT driver_id, date(start_time), COUNT(*), SUM(distance), SUM(passengers)
+        FROM trips WHERE status = 'completed'
+        GROUP BY driver_id, date(start_time)
+    ''')
+    
+    conn.execute('DELETE FROM trip_distance_bins')
+    conn.execute('''
+        INSERT INTO trip_distance_bins (driver_id, bin, trip_count)
+        SELECT driver_id, CAST(distance / ? AS INTEGER), COUNT(*)
+        FROM trips WHERE status = 'completed'
+        GROUP BY 1, 2
+    ''', (DISTANCE_BIN_KM,))
+
+def _migrate_maintenance_state(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_state (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+
+def _migrate_track_store(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS location_tracks (
+            driver_id INTEGER NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            point_count INTEGER NOT NULL,
+            last_time INTEGER NOT NULL,
+            last_lat INTEGER NOT NULL,
+            last_lon INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (driver_id, bucket_start),
+            FOREIGN KEY (driver_id) REFERENCES drivers(id)
+        ) WITHOUT ROWID
+    ''')
+
+def _migrate_location_shards(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS location_shards (
+            route TEXT PRIMARY KEY
+        )
+    ''')
+
+def _migrate_photo_sources(conn):
+    # Maps the hash of an uploaded original to the rendered variants, so a repeated upload skips rendering
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS photo_sources (
+            source_hash TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            photo_hash TEXT NOT NULL,
+            PRIMARY KEY (source_hash, variant),
+            FOREIGN KEY (photo_hash) REFERENCES photos(hash)
+        ) WITHOUT ROWID
+    ''')
+
+def _migrate_location_time_index(conn):
+    # Compaction selects pings by age, which rowid order only approximates
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_location_updates_time ON location_updates (update_time)')
+
+def _migrate_change_feed_per_driver(conn):
+    conn.execute('ALTER TABLE driver_changes RENAME TO driver_changes_log')
+    conn.execute('''
+        CREATE TABLE driver_changes (
+            driver_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            change_type TEXT NOT NULL,
+            change_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO driver_changes (driver_id, seq, change_type, change_time)
+        SELECT driver_id, MAX(seq), change_type, change_time FROM driver_changes_log GROUP BY driver_id
+    ''')
+    conn.execute('DROP TABLE driver_changes_log')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_driver_changes_seq ON driver_changes (seq)')
+
+def _migrate_drop_trip_status_index(conn):
+    # idx_trips_driver_status_start covers every lookup the older (driver_id, status) index served
+    conn.execute('DROP INDEX IF EXISTS idx_trips_driver_status')
+
+MIGRATIONS = [
+    _migrate_base_schema,
+    _migrate_photo_store,
+    _migrate_spatial_index,
+    _migrate_lookup_indexes,
+    _migrate_rating_stats,
+    _migrate_trip_path_tracking,
+    _migrate_data_versions,
+    _migrate_change_feed,
+    _migrate_trip_rollups,
+    _migrate_maintenance_state,
+    _migrate_track_store,
+    _migrate_location_shards,
+    _migrate_photo_sources,
+    _migrate_location_time_index,
+    _migrate_change_feed_per_driver,
+    _migrate_drop_trip_status_index
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _move_inline_photos(conn):
+    rows = conn.execute('SELECT id, photo FROM drivers WHERE photo IS NOT NULL').fetchall()
+    for driver_id, photo in rows:
+        if photo:
+            _store_photo(conn, driver_id, photo)
+    if rows:
+        conn.execute('UPDATE drivers SET photo = NULL WHERE photo IS NOT NULL')
+
+def _store_photo(conn, driver_id, photo, mime_type='image/png', variant='profile'):
+    if isinstance(photo, str):
+        photo = base64.b64decode(photo)
+    photo_hash = hashlib.sha256(photo).hexdigest()
+    
+    conn.execute('''
+        INSERT OR IGNORE INTO photos (hash, mime_type, data) VALUES (?, ?, ?)
+    ''', (photo_hash, mime_type, photo))
+    conn.execute('''
+        INSERT OR REPLACE INTO driver_photos (driver_id, variant, photo_hash) VALUES (?, ?, ?)
+    ''', (driver_id, variant, photo_hash))
+    return photo_hash
+
+def _driver_from_row(row):
+    return {
+        'id': row[0],
+        'first_name': row[1],
+        'last_name': row[2],
+        'contact_number': row[3],
+        'license_number': row[4],
+        'license_plate': row[5],
+        'route': row[6],
+        'max_capacity': row[7],
+        'current_capacity': row[8],
+        'location': [row[9], row[10]],
+        'registration_time': row[11],
+        'total_trips': row[12],
+        'total_distance': row[13],
+        'average_rating': row[14],
+        'total_ratings': row[15]
+    }
+
+def add_driver(driver_data):
     try:
-        cursor.execute('''
-            INSERT INTO drivers (
-                first_name, last_name, contact_number, license_number, 
-                license_plate, route, max_capacity, current_capacity,
-                photo, latitude, longitude
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            driver_data['first_name'],
-            driver_data['last_name'],
-            driver_data['contact_number'],
-            driver_data['license_number'],
-            driver_data['license_plate'],
-            driver_data['route'],
-            driver_data['max_capacity'],
-            driver_data.get('current_capacity', 0),
-            driver_data['photo'],
-            driver_data['location'][0],
-            driver_data['location'][1]
-        ))
-        conn.commit()
-        driver_id = cursor.lastrowid
-        conn.close()
-        return driver_id
-    except sqlite3.IntegrityError as e:
-        conn.close()
+        return _run_write(_add_driver_tx, driver_data)
+    except sqlite3.IntegrityError:
         return None
 
+def _add_driver_tx(conn, driver_data):
+    cursor = conn.execute('''
+        INSERT INTO drivers (
+            first_name, last_name, contact_number, license_number, 
+            license_plate, route, max_capacity, current_capacity,
+            latitude, longitude
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        driver_data['first_name'],
+        driver_data['last_name'],
+        driver_data['contact_number'],
+        driver_data['license_number'],
+        driver_data['license_plate'],
+        driver_data['route'],
+        driver_data['max_capacity'],
+        driver_data.get('current_capacity', 0),
+        driver_data['location'][0],
+        driver_data['location'][1]
+    ))
+    driver_id = cursor.lastrowid
+    conn.execute('''
+        INSERT INTO driver_locations (id, min_lat, max_lat, min_lon, max_lon)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        driver_id,
+        driver_data['location'][0], driver_data['location'][0],
+        driver_data['location'][1], driver_data['location'][1]
+    ))
+    if driver_data.get('photo'):
+        _store_photo(conn, driver_id, driver_data['photo'], driver_data.get('photo_mime_type', 'image/png'))
+    _record_changes(conn, [driver_id], 'added')
+    _touch(conn, 'drivers', 'driver_positions', 'photos')
+    return driver_id
+
 def add_commuter(commuter_data):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+    return _run_write(_add_commuter_tx, commuter_data)
+
+def _add_commuter_tx(conn, commuter_data):
+    cursor = conn.execute('''
         INSERT INTO commuters (
             first_name, last_name, contact_number, email,
             latitude, longitude
@@ -138,123 +994,876 @@ def add_commuter(commuter_data):
         commuter_data['location'][0],
         commuter_data['location'][1]
     ))
-    conn.commit()
-    commuter_id = cursor.lastrowid
-    conn.close()
-    return commuter_id
+    _touch(conn, 'commuters')
+    return cursor.lastrowid
 
 def get_all_drivers():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM drivers')
-    rows = cursor.fetchall()
-    conn.close()
+    rows = _cached_fetch(('drivers',), f'SELECT {_DRIVER_SELECT} FROM drivers')
     
-    drivers = []
-    for row in rows:
-        drivers.append({
-            'id': row[0],
-            'first_name': row[1],
-            'last_name': row[2],
-            'contact_number': row[3],
-            'license_number': row[4],
-            'license_plate': row[5],
-            'route': row[6],
-            'max_capacity': row[7],
-            'current_capacity': row[8],
-            'photo': row[9],
-            'location': [row[10], row[11]],
-            'registration_time': row[12],
-            'total_trips': row[13],
-            'total_distance': row[14],
-            'average_rating': row[15],
-            'total_ratings': row[16]
-        })
-    return drivers
+    return _apply_positions([_driver_from_row(row) for row in rows])
 
 def get_driver_by_license(license_plate):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    row = _cached_fetch(('drivers',), f'SELECT {_DRIVER_SELECT} FROM drivers WHERE license_plate = ?', (license_plate,), one=True)
     
-    cursor.execute('SELECT * FROM drivers WHERE license_plate = ?', (license_plate,))
-    row = cursor.fetchone()
-    conn.close()
+    if row:
+        return _apply_positions([_driver_from_row(row)], ' WHERE id = ?', (row[0],))[0]
+    return None
+
+def get_drivers_by_ids(driver_ids):
+    driver_ids = list(driver_ids)
+    if not driver_ids:
+        return []
+    
+    rows = _cached_fetch(('drivers',), f'''
+        SELECT {_DRIVER_SELECT} FROM drivers WHERE id IN ({', '.join('?' for _ in driver_ids)})
+    ''', driver_ids)
+    return _apply_positions(
+        [_driver_from_row(row) for row in rows],
+        f" WHERE id IN ({', '.join('?' for _ in driver_ids)})", driver_ids
+    )
+
+def _apply_positions(drivers, where='', params=()):
+    # Profile rows are cached against 'drivers' and positions against 'driver_positions', so a location
+    # flush only invalidates this narrow read and not the profile rows
+    positions = _cached_fetch(('driver_positions',), 'SELECT id, latitude, longitude FROM drivers' + where, params)
+    positions = {row[0]: row[1:] for row in positions}
+    for driver in drivers:
+        if driver['id'] in positions:
+            driver['location'] = list(positions[driver['id']])
+    return _apply_buffered_locations(drivers)
+
+def get_driver_columns(columns=('id', 'latitude', 'longitude'), routes=None, min_free_seats=0, as_frame=False):
+    columns = _project(columns, DRIVER_COLUMNS)
+    selected = columns if 'id' in columns else ['id'] + columns
+    query = f"SELECT {', '.join(selected)} FROM drivers WHERE max_capacity - current_capacity >= ?"
+    params = [min_free_seats]
+    if routes is not None:
+        query += f" AND route IN ({', '.join('?' for _ in routes)})"
+        params += list(routes)
+    tables = ('drivers', 'driver_positions') if 'latitude' in selected or 'longitude' in selected else ('drivers',)
+    result = _cached_columns(tables, query + ' ORDER BY id', params)
+    
+    buffered = _buffered_locations()
+    if buffered and ('latitude' in result or 'longitude' in result):
+        _overlay_buffered_locations(result, buffered)
+    
+    if 'id' not in columns:
+        del result['id']
+    return _to_frame(result) if as_frame else result
+
+def _overlay_buffered_locations(result, buffered):
+    import numpy as np
+    
+    ids = result['id']
+    moved = np.flatnonzero(np.isin(ids, np.fromiter(buffered, dtype=np.int64, count=len(buffered))))
+    if not len(moved):
+        return
+    for axis, name in enumerate(('latitude', 'longitude')):
+        if name in result:
+            values = result[name].copy()
+            values[moved] = [buffered[driver_id][axis] for driver_id in ids[moved].tolist()]
+            result[name] = values
+
+def get_driver_photo(driver_id, variant='profile'):
+    row = _cached_fetch(('photos',), '''
+        SELECT p.data FROM driver_photos dp
+        JOIN photos p ON p.hash = dp.photo_hash
+        WHERE dp.driver_id = ? AND dp.variant = ?
+    ''', (driver_id, variant), one=True)
     
     if row:
-        return {
-            'id': row[0],
-            'first_name': row[1],
-            'last_name': row[2],
-            'contact_number': row[3],
-            'license_number': row[4],
-            'license_plate': row[5],
-            'route': row[6],
-            'max_capacity': row[7],
-            'current_capacity': row[8],
-            'photo': row[9],
-            'location': [row[10], row[11]],
-            'registration_time': row[12],
-            'total_trips': row[13],
-            'total_distance': row[14],
-            'average_rating': row[15],
-            'total_ratings': row[16]
-        }
+        return row[0]
     return None
 
+def attach_driver_photos(driver_id, source_hash, variants=None):
+    return _run_write(_attach_driver_photos_tx, driver_id, source_hash, variants)
+
+def _attach_driver_photos_tx(conn, driver_id, source_hash, variants=None):
+    if variants is None:
+        # Reuse the variants already rendered from the same original, if any
+        linked = conn.execute('''
+            INSERT OR REPLACE INTO driver_photos (driver_id, variant, photo_hash)
+            SELECT ?, variant, photo_hash FROM photo_sources WHERE source_hash = ?
+        ''', (driver_id, source_hash)).rowcount
+    else:
+        linked = 0
+        for variant, mime_type, data in variants:
+            photo_hash = _store_photo(conn, driver_id, data, mime_type, variant)
+            conn.execute('''
+                INSERT OR REPLACE INTO photo_sources (source_hash, variant, photo_hash) VALUES (?, ?, ?)
+            ''', (source_hash, variant, photo_hash))
+            linked += 1
+    if linked:
+        _touch(conn, 'photos')
+    return linked
+
 def update_driver_location(driver_id, lat, lon):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    update_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
     
-    cursor.execute('''
+    with _location_lock:
+        _latest_locations[driver_id] = (lat, lon)
+        _pending_location_rows.append((driver_id, lat, lon, update_time))
+        flush_due = (
+            len(_pending_location_rows) >= LOCATION_FLUSH_SIZE
+            or time.monotonic() - _last_location_flush >= LOCATION_FLUSH_INTERVAL
+        )
+    
+    _start_location_flusher()
+    if flush_due:
+        flush_location_updates()
+
+def flush_location_updates():
+    global _last_location_flush
+    
+    with _location_flush_lock:
+        with _location_lock:
+            rows = _pending_location_rows[:]
+            latest = dict(_latest_locations)
+            del _pending_location_rows[:]
+            _last_location_flush = time.monotonic()
+        
+        if not rows:
+            return 0
+        
+        try:
+            _store_location_rows(rows)
+        except Exception:
+            with _location_lock:
+                _pending_location_rows[:0] = rows
+            raise
+        
+        with _location_lock:
+            for driver_id, position in latest.items():
+                if _latest_locations.get(driver_id) == position:
+                    del _latest_locations[driver_id]
+        return len(rows)
+
+def record_location_batch(pings):
+    default_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    rows = [
+        (ping[0], ping[1], ping[2], ping[3] if len(ping) > 3 else default_time)
+        for ping in pings
+    ]
+    if not rows:
+        return 0
+    
+    # Pings come from devices, so ids that match no driver are dropped instead of growing the history
+    with get_connection() as conn:
+        known = {row[0] for row in conn.execute('''
+            SELECT id FROM drivers WHERE id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(sorted({row[0] for row in rows})),))}
+    rows = [row for row in rows if row[0] in known]
+    if not rows:
+        return 0
+    
+    _store_location_rows(rows)
+    return len(rows)
+
+def _store_location_rows(rows):
+    history_rows = rows
+    shard_routes = ()
+    if LOCATION_SHARDING == 'route' and TRACK_STORE_MODE != 'only':
+        # Shard files are written before the main write transaction opens, so the main write
+        # lock is never held while waiting on a shard
+        with get_connection() as conn:
+            rows_by_route = _group_rows_by_route(conn, rows)
+        history_rows = rows_by_route.pop(None, [])
+        shard_routes = list(rows_by_route)
+        _write_shard_rows(rows_by_route)
+    _run_write(_write_location_rows, rows, history_rows, shard_routes)
+
+def _write_location_rows(conn, rows, history_rows=None, shard_routes=()):
+    latest = {}
+    for driver_id, lat, lon, _ in rows:
+        latest[driver_id] = (lat, lon)
+    
+    conn.executemany('''
         UPDATE drivers SET latitude = ?, longitude = ? WHERE id = ?
-    ''', (lat, lon, driver_id))
+    ''', [(lat, lon, driver_id) for driver_id, (lat, lon) in latest.items()])
     
-    cursor.execute('''
-        INSERT INTO location_updates (driver_id, latitude, longitude)
-        VALUES (?, ?, ?)
-    ''', (driver_id, lat, lon))
+    conn.executemany('''
+        INSERT OR REPLACE INTO driver_locations (id, min_lat, max_lat, min_lon, max_lon)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(driver_id, lat, lat, lon, lon) for driver_id, (lat, lon) in latest.items()])
     
+    tables = ['driver_positions']
+    if TRACK_STORE_MODE != 'only':
+        if shard_routes:
+            conn.executemany('INSERT OR IGNORE INTO location_shards (route) VALUES (?)', [(route,) for route in shard_routes])
+        conn.executemany('''
+            INSERT INTO location_updates (driver_id, latitude, longitude, update_time)
+            VALUES (?, ?, ?, ?)
+        ''', rows if history_rows is None else history_rows)
+        tables.append('location_updates')
+    if TRACK_STORE_MODE in ('on', 'only'):
+        _append_tracks(conn, rows)
+        tables.append('location_tracks')
+    
+    _record_changes(conn, latest.keys(), 'moved')
+    
+    if _accumulate_trip_paths(conn, rows, latest.keys()):
+        tables.append('trips')
+    _touch(conn, *tables)
+
+def _location_shard_path(route):
+    base, ext = os.path.splitext(DB_PATH)
+    slug = ''.join(c if c.isalnum() else '_' for c in route.lower())
+    return f"{base}.locations.{slug}{ext or '.db'}"
+
+def _init_shard(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS location_updates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            driver_id INTEGER NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_location_updates_driver_time ON location_updates (driver_id, update_time)')
+    _migrate_location_time_index(conn)
+    _migrate_maintenance_state(conn)
     conn.commit()
-    conn.close()
 
-def update_driver_capacity(driver_id, capacity):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+@contextmanager
+def _shard_connection(route):
+    path = _location_shard_path(route)
+    with _shard_lock:
+        entry = _shard_connections.get(path)
+        if entry is None:
+            conn = _open_connection(path)
+            _init_shard(conn)
+            entry = _shard_connections[path] = (conn, threading.Lock())
     
-    cursor.execute('''
+    conn, lock = entry
+    with lock:
+        with conn:
+            yield conn
+
+def _group_rows_by_route(conn, rows):
+    driver_ids = list({row[0] for row in rows})
+    routes = dict(conn.execute(f'''
+        SELECT id, route FROM drivers WHERE id IN ({', '.join('?' for _ in driver_ids)})
+    ''', driver_ids).fetchall())
+    
+    rows_by_route = {}
+    for row in rows:
+        rows_by_route.setdefault(routes.get(row[0]), []).append(row)
+    return rows_by_route
+
+def _write_shard_rows(rows_by_route):
+    # Shard files commit on their own, so a retried flush may store a ping twice but never loses one
+    for route, route_rows in rows_by_route.items():
+        with _shard_connection(route) as shard:
+            shard.executemany('''
+                INSERT INTO location_updates (driver_id, latitude, longitude, update_time)
+                VALUES (?, ?, ?, ?)
+            ''', route_rows)
+
+def _location_stores():
+    stores = [get_connection]
+    if LOCATION_SHARDING == 'route':
+        with get_connection() as conn:
+            routes = [row[0] for row in conn.execute('SELECT route FROM location_shards ORDER BY route')]
+        stores += [functools.partial(_shard_connection, route) for route in routes]
+    return stores
+
+def _tagged_track(driver_id, start, end):
+    for epoch, lat, lon in iter_driver_track(driver_id, start, end):
+        yield epoch, driver_id, lat, lon
+
+def _track_history(driver_id, start, end, limit):
+    if driver_id is not None:
+        driver_ids = [driver_id]
+    else:
+        with get_connection() as conn:
+            driver_ids = [row[0] for row in conn.execute('SELECT DISTINCT driver_id FROM location_tracks')]
+    
+    tracks = [_tagged_track(track_driver, start, end) for track_driver in driver_ids]
+    history = []
+    for epoch, track_driver, lat, lon in itertools.islice(heapq.merge(*tracks), limit):
+        history.append({
+            'driver_id': track_driver,
+            'location': [lat, lon],
+            'update_time': datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        })
+    return history
+
+def get_location_history(driver_id=None, start=None, end=None, limit=None):
+    if TRACK_STORE_MODE == 'only':
+        # location_updates is not written in this mode; the compact track store holds the history
+        flush_location_updates()
+        return _track_history(driver_id, start, end, limit)
+    
+    filters = []
+    params = []
+    if driver_id is not None:
+        filters.append('driver_id = ?')
+        params.append(driver_id)
+    if start is not None:
+        filters.append('update_time >= ?')
+        params.append(str(start))
+    if end is not None:
+        filters.append('update_time <= ?')
+        params.append(str(end))
+    where = ' WHERE ' + ' AND '.join(filters) if filters else ''
+    
+    flush_location_updates()
+    with get_connection() as conn:
+        if driver_id is not None:
+            routes = [row[0] for row in conn.execute('''
+                SELECT route FROM location_shards WHERE route = (SELECT route FROM drivers WHERE id = ?)
+            ''', (driver_id,))]
+        else:
+            routes = [row[0] for row in conn.execute('SELECT route FROM location_shards ORDER BY route')]
+    paths = [path for path in map(_location_shard_path, routes) if os.path.exists(path)]
+    
+    # Fan out over the main file plus the shard files, a few ATTACHed at a time, and merge by time
+    groups = [[None] + paths[:MAX_ATTACHED_SHARDS]]
+    for offset in range(MAX_ATTACHED_SHARDS, len(paths), MAX_ATTACHED_SHARDS):
+        groups.append(paths[offset:offset + MAX_ATTACHED_SHARDS])
+    
+    results = []
+    for group in groups:
+        conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, uri=True)
+        try:
+            schemas = []
+            for index, path in enumerate(group):
+                if path is None:
+                    schemas.append('main')
+                    continue
+                shard_uri = 'file:' + urllib.parse.quote(os.path.abspath(path)) + '?mode=ro'
+                conn.execute(f'ATTACH DATABASE ? AS shard_{index}', (shard_uri,))
+                schemas.append(f'shard_{index}')
+            
+            query = ' UNION ALL '.join(
+                f'SELECT driver_id, latitude, longitude, update_time FROM {schema}.location_updates{where}'
+                for schema in schemas
+            ) + ' ORDER BY update_time'
+            group_params = params * len(schemas)
+            if limit is not None:
+                query += ' LIMIT ?'
+                group_params.append(limit)
+            results.append(conn.execute(query, group_params).fetchall())
+        finally:
+            conn.close()
+    
+    history = []
+    for row in itertools.islice(heapq.merge(*results, key=lambda row: row[3]), limit):
+        history.append({
+            'driver_id': row[0],
+            'location': [row[1], row[2]],
+            'update_time': row[3]
+        })
+    return history
+
+def _encode_varint(value, out):
+    # Zigzag first so small negative deltas stay small
+    value = (value << 1) ^ (value >> 63)
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _decode_varints(data):
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        yield (value >> 1) ^ -(value & 1)
+        value = 0
+        shift = 0
+
+def _epoch_seconds(timestamp):
+    return int(datetime.strptime(str(timestamp)[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp())
+
+def _append_tracks(conn, rows):
+    buckets = {}
+    for driver_id, lat, lon, update_time in rows:
+        epoch = _epoch_seconds(update_time)
+        bucket_start = epoch - epoch % TRACK_BUCKET_SECONDS
+        buckets.setdefault((driver_id, bucket_start), []).append(
+            (epoch, round(lat * TRACK_COORD_SCALE), round(lon * TRACK_COORD_SCALE))
+        )
+    
+    for (driver_id, bucket_start), points in buckets.items():
+        existing = conn.execute('''
+            SELECT point_count, last_time, last_lat, last_lon, data FROM location_tracks
+            WHERE driver_id = ? AND bucket_start = ?
+        ''', (driver_id, bucket_start)).fetchone()
+        if existing:
+            count, last_time, last_lat, last_lon, data = existing
+            data = bytearray(data)
+        else:
+            count, last_time, last_lat, last_lon, data = 0, bucket_start, 0, 0, bytearray()
+        
+        # Each point is three varints: seconds, latitude and longitude deltas from the previous point
+        for epoch, lat, lon in points:
+            _encode_varint(epoch - last_time, data)
+            _encode_varint(lat - last_lat, data)
+            _encode_varint(lon - last_lon, data)
+            last_time, last_lat, last_lon = epoch, lat, lon
+        
+        conn.execute('''
+            INSERT OR REPLACE INTO location_tracks (driver_id, bucket_start, point_count, last_time, last_lat, last_lon, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (driver_id, bucket_start, count + len(points), last_time, last_lat, last_lon, bytes(data)))
+
+def decode_track(bucket_start, data):
+    values = _decode_varints(data)
+    epoch, lat, lon = bucket_start, 0, 0
+    for delta_time, delta_lat, delta_lon in zip(values, values, values):
+        epoch += delta_time
+        lat += delta_lat
+        lon += delta_lon
+        yield epoch, lat / TRACK_COORD_SCALE, lon / TRACK_COORD_SCALE
+
+def iter_driver_track(driver_id, start=None, end=None):
+    start_epoch = _epoch_seconds(start) if start is not None else 0
+    end_epoch = _epoch_seconds(end) if end is not None else None
+    
+    # Buckets are read a page at a time so long histories are never held in memory at once
+    next_bucket = start_epoch - start_epoch % TRACK_BUCKET_SECONDS
+    while True:
+        with get_connection() as conn:
+            buckets = conn.execute('''
+                SELECT bucket_start, data FROM location_tracks
+                WHERE driver_id = ? AND bucket_start >= ? AND bucket_start <= ?
+                ORDER BY bucket_start LIMIT ?
+            ''', (driver_id, next_bucket, end_epoch if end_epoch is not None else 2 ** 62, TRACK_READ_BUCKETS)).fetchall()
+        
+        for bucket_start, data in buckets:
+            for point in decode_track(bucket_start, data):
+                if point[0] >= start_epoch and (end_epoch is None or point[0] <= end_epoch):
+                    yield point
+        
+        if len(buckets) < TRACK_READ_BUCKETS:
+            return
+        next_bucket = buckets[-1][0] + 1
+
+def get_driver_track(driver_id, start=None, end=None):
+    import numpy as np
+    
+    points = np.array(list(iter_driver_track(driver_id, start, end)), dtype=np.float64).reshape(-1, 3)
+    return {
+        'time': points[:, 0].astype(np.int64),
+        'latitude': points[:, 1],
+        'longitude': points[:, 2]
+    }
+
+def _accumulate_trip_paths(conn, rows, driver_ids):
+    driver_ids = list(driver_ids)
+    active_trips = conn.execute(f'''
+        SELECT id, driver_id, last_lat, last_lon FROM trips
+        WHERE status = 'active' AND driver_id IN ({', '.join('?' for _ in driver_ids)})
+    ''', driver_ids).fetchall()
+    if not active_trips:
+        return False
+    
+    pings = {}
+    for driver_id, lat, lon, _ in rows:
+        pings.setdefault(driver_id, []).append((lat, lon))
+    
+    updates = []
+    for trip_id, driver_id, last_lat, last_lon in active_trips:
+        added = 0.0
+        for lat, lon in pings[driver_id]:
+            if last_lat is not None:
+                added += _haversine_km(last_lat, last_lon, lat, lon)
+            last_lat, last_lon = lat, lon
+        updates.append((added, last_lat, last_lon, trip_id))
+    
+    conn.executemany('''
+        UPDATE trips SET path_distance = path_distance + ?, last_lat = ?, last_lon = ?
+        WHERE id = ?
+    ''', updates)
+    return True
+
+def _record_changes(conn, driver_ids, change_type):
+    # Each driver keeps one row that moves to a fresh seq, so the feed never grows past the fleet
+    conn.executemany('''
+        INSERT INTO driver_changes (driver_id, seq, change_type)
+        VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM driver_changes), ?)
+        ON CONFLICT (driver_id) DO UPDATE SET
+            seq = excluded.seq,
+            change_type = excluded.change_type,
+            change_time = CURRENT_TIMESTAMP
+    ''', [(driver_id, change_type) for driver_id in driver_ids])
+    _touch(conn, 'driver_changes')
+
+def get_change_cursor():
+    row = _cached_fetch(('driver_changes',), 'SELECT COALESCE(MAX(seq), 0) FROM driver_changes', one=True)
+    return row[0]
+
+def get_driver_changes(since_seq, lat, lon, radius_km, watched=()):
+    # Only drivers inside the search box, plus the ones already on screen so they can be removed when
+    # they leave it. The cursor is read in the same statement, so rows skipped here are never revisited
+    dlat, dlon = _degree_offsets(lat, radius_km)
+    rows = _cached_fetch(('driver_changes',), '''
+        WITH head AS (SELECT COALESCE(MAX(seq), ?) AS seq FROM driver_changes)
+        SELECT head.seq, c.driver_id, c.change_type FROM head
+        LEFT JOIN driver_changes c ON c.seq > ? AND c.seq <= head.seq AND (
+            c.driver_id IN (
+                SELECT id FROM driver_locations
+                WHERE min_lat <= ? AND max_lat >= ? AND min_lon <= ? AND max_lon >= ?
+            )
+            OR c.driver_id IN (SELECT value FROM json_each(?))
+        )
+        ORDER BY c.seq
+    ''', (since_seq, since_seq, lat + dlat, lat - dlat, lon + dlon, lon - dlon, json.dumps(sorted(watched))))
+    
+    changes = {}
+    for _, driver_id, change_type in rows:
+        if driver_id is not None:
+            changes[driver_id] = {change_type}
+    return rows[0][0], changes
+
+def _start_location_flusher():
+    global _location_flusher
+    
+    if _location_flusher is not None:
+        return
+    with _location_lock:
+        if _location_flusher is None:
+            _location_flusher = threading.Thread(target=_location_flush_loop, name="location-flusher", daemon=True)
+            _location_flusher.start()
+
+def _location_flush_loop():
+    while True:
+        time.sleep(LOCATION_FLUSH_INTERVAL)
+        try:
+            flush_location_updates()
+        except sqlite3.Error:
+            pass
+
+def _buffered_locations():
+    with _location_lock:
+        return dict(_latest_locations)
+
+def _apply_buffered_locations(drivers):
+    buffered = _buffered_locations()
+    if buffered:
+        for driver in drivers:
+            if driver['id'] in buffered:
+                driver['location'] = list(buffered[driver['id']])
+    return drivers
+
+atexit.register(flush_location_updates)
+
+def _get_state(conn, name, default=0):
+    row = conn.execute('SELECT value FROM maintenance_state WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else default
+
+def _set_state(conn, name, value):
+    conn.execute('''
+        INSERT INTO maintenance_state (name, value) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET value = excluded.value
+    ''', (name, value))
+
+def _store_write(connect, tx, *args):
+    # The main database goes through _run_write, so maintenance shares the writer queue when it is
+    # enabled; shard files are only written by the location flush and the compactor
+    if connect is get_connection:
+        return _run_write(tx, *args, True)
+    with connect() as conn:
+        return tx(conn, *args, False)
+
+def _expire_location_batch(connect, cutoff):
+    return _store_write(connect, _expire_location_tx, cutoff)
+
+def _expire_location_tx(conn, cutoff, main):
+    # Candidates come from the update_time index, so pings that arrived out of order still expire
+    deleted = conn.execute('''
+        DELETE FROM location_updates WHERE id IN (
+            SELECT id FROM location_updates WHERE update_time < ? LIMIT ?
+        )
+    ''', (cutoff, COMPACTION_BATCH_SIZE)).rowcount
+    if deleted and main:
+        _touch(conn, 'location_updates')
+    return deleted
+
+def _expire_track_batch(cutoff_epoch):
+    return _run_write(_expire_track_tx, cutoff_epoch)
+
+def _expire_track_tx(conn, cutoff_epoch):
+    deleted = conn.execute('''
+        DELETE FROM location_tracks WHERE (driver_id, bucket_start) IN (
+            SELECT driver_id, bucket_start FROM location_tracks WHERE bucket_start < ? LIMIT ?
+        )
+    ''', (cutoff_epoch, COMPACTION_BATCH_SIZE)).rowcount
+    if deleted:
+        _touch(conn, 'location_tracks')
+    return deleted
+
+def _downsample_location_batch(connect, full_resolution_cutoff):
+    with connect() as conn:
+        after_time = _get_state(conn, 'location_downsample_time')
+        after_id = _get_state(conn, 'location_downsample_after_id')
+        
+        # The pass walks (update_time, id) rather than rowids, so pings inside the full-resolution
+        # window are never in range and a ping with a skewed clock cannot hold back older history
+        window = conn.execute('''
+            SELECT id, update_time FROM location_updates
+            WHERE (update_time, id) > (datetime(?, 'unixepoch'), ?) AND update_time < ?
+            ORDER BY update_time, id LIMIT ?
+        ''', (after_time, after_id, full_resolution_cutoff, COMPACTION_BATCH_SIZE)).fetchall()
+        if not window:
+            return 0, False
+        last_id, last_time = window[-1]
+        
+        # A ping is dropped when the same driver already has an earlier ping in its time bucket,
+        # so the first ping of every bucket survives regardless of how batches are cut. Each probe is
+        # bounded to its own bucket, and the candidates are picked before the write transaction opens
+        doomed = [row[0] for row in conn.execute('''
+            SELECT l.id FROM location_updates l
+            WHERE l.id IN (SELECT value FROM json_each(?))
+            AND EXISTS (
+                SELECT 1 FROM location_updates p
+                WHERE p.driver_id = l.driver_id
+                AND p.update_time >= datetime(CAST(strftime('%s', l.update_time) AS INTEGER) / ? * ?, 'unixepoch')
+                AND p.update_time <= l.update_time
+                AND (p.update_time < l.update_time OR p.id < l.id)
+            )
+        ''', (json.dumps([row[0] for row in window]), LOCATION_DOWNSAMPLE_SECONDS, LOCATION_DOWNSAMPLE_SECONDS))]
+    
+    return _store_write(connect, _downsample_location_tx, doomed, _epoch_seconds(last_time), last_id), True
+
+def _downsample_location_tx(conn, doomed, last_time, last_id, main):
+    deleted = conn.execute('''
+        DELETE FROM location_updates WHERE id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(doomed),)).rowcount if doomed else 0
+    _set_state(conn, 'location_downsample_time', last_time)
+    _set_state(conn, 'location_downsample_after_id', last_id)
+    if deleted and main:
+        _touch(conn, 'location_updates')
+    return deleted
+
+def enable_incremental_vacuum():
+    # One-off maintenance step: switching an existing database takes a full VACUUM, which
+    # rewrites the whole file under the write lock, so it is never run from the app
+    init_database()
+    conn = _acquire_connection()
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return False
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        return True
+    finally:
+        _release_connection(conn)
+
+def _incremental_vacuum(pages):
+    for connect in _location_stores():
+        _store_write(connect, _incremental_vacuum_tx, pages)
+
+def _incremental_vacuum_tx(conn, pages, main):
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        return
+    # The pragma frees one page per step, and sqlite3 only steps a statement without result
+    # columns once, so it is issued once per page
+    free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    for _ in range(min(int(pages), free_pages)):
+        conn.execute('PRAGMA incremental_vacuum(1)')
+
+def compact_location_updates(now=None, max_batches=None, vacuum_pages=VACUUM_PAGES_PER_RUN):
+    init_database()
+    flush_location_updates()
+    
+    now = now or datetime.now(timezone.utc)
+    retention_cutoff = (now - timedelta(days=LOCATION_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+    full_resolution_cutoff = (now - timedelta(days=LOCATION_FULL_RESOLUTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+    stats = {'expired': 0, 'expired_tracks': 0, 'downsampled': 0, 'batches': 0}
+    
+    with _compaction_lock:
+        stores = _location_stores()
+        for connect in stores:
+            while max_batches is None or stats['batches'] < max_batches:
+                expired = _expire_location_batch(connect, retention_cutoff)
+                stats['batches'] += 1
+                stats['expired'] += expired
+                if expired < COMPACTION_BATCH_SIZE:
+                    break
+                time.sleep(COMPACTION_PAUSE)
+        
+        while max_batches is None or stats['batches'] < max_batches:
+            expired = _expire_track_batch(_epoch_seconds(retention_cutoff))
+            stats['batches'] += 1
+            stats['expired_tracks'] += expired
+            if expired < COMPACTION_BATCH_SIZE:
+                break
+            time.sleep(COMPACTION_PAUSE)
+        
+        for connect in stores:
+            while max_batches is None or stats['batches'] < max_batches:
+                downsampled, advanced = _downsample_location_batch(connect, full_resolution_cutoff)
+                stats['batches'] += 1
+                stats['downsampled'] += downsampled
+                if not advanced:
+                    break
+                time.sleep(COMPACTION_PAUSE)
+        
+        if vacuum_pages:
+            _incremental_vacuum(vacuum_pages)
+    return stats
+
+def start_location_compaction(interval=COMPACTION_INTERVAL):
+    global _compactor
+    
+    if not BACKGROUND_COMPACTION or _compactor is not None:
+        return
+    with _compaction_lock:
+        if _compactor is None:
+            _compactor = threading.Thread(target=_compaction_loop, args=(interval,), name="location-compactor", daemon=True)
+            _compactor.start()
+
+def _compaction_loop(interval):
+    while True:
+        try:
+            compact_location_updates()
+        except sqlite3.Error:
+            pass
+        time.sleep(interval)
+
+def _degree_offsets(lat, radius_km):
+    return radius_km / KM_PER_DEGREE_LAT, radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+
+def find_nearest_drivers(lat, lon, k=10, routes=None, min_free_seats=0, radius_km=5.0):
+    import numpy as np
+    import eta
+    
+    if routes is not None and not routes:
+        return []
+    
+    filters = ' WHERE d.max_capacity - d.current_capacity >= ?'
+    filter_params = [min_free_seats]
+    if routes is not None:
+        filters += f" AND d.route IN ({', '.join('?' for _ in routes)})"
+        filter_params += list(routes)
+    
+    query = 'SELECT d.id, d.latitude, d.longitude FROM driver_locations l JOIN drivers d ON d.id = l.id' + filters
+    params = list(filter_params)
+    
+    buffered = _buffered_locations()
+    if radius_km is not None:
+        dlat, dlon = _degree_offsets(lat, radius_km)
+        query += ' AND l.min_lat <= ? AND l.max_lat >= ? AND l.min_lon <= ? AND l.max_lon >= ?'
+        params += [lat + dlat, lat - dlat, lon + dlon, lon - dlon]
+        moved_in = [
+            driver_id for driver_id, (blat, blon) in buffered.items()
+            if abs(blat - lat) <= dlat and abs(blon - lon) <= dlon
+        ]
+    else:
+        moved_in = []
+    
+    candidates = _cached_columns(('drivers', 'driver_positions'), query, params)
+    if moved_in:
+        moved_in = np.setdiff1d(np.asarray(moved_in, dtype=np.int64), candidates['id']).tolist()
+    if moved_in:
+        with get_connection() as conn:
+            extra = _columns_from_cursor(conn.execute(
+                'SELECT d.id, d.latitude, d.longitude FROM drivers d' + filters
+                + f" AND d.id IN ({', '.join('?' for _ in moved_in)})",
+                filter_params + moved_in
+            ))
+        candidates = {name: np.concatenate([candidates[name], extra[name]]) for name in candidates}
+    
+    if buffered:
+        _overlay_buffered_locations(candidates, buffered)
+    
+    distances = eta.haversine_km((lat, lon), candidates['latitude'], candidates['longitude'])
+    if radius_km is None:
+        nearest = np.arange(len(distances))
+    else:
+        nearest = np.flatnonzero(distances <= radius_km)
+    if k is not None and len(nearest) > k:
+        nearest = nearest[np.argpartition(distances[nearest], k - 1)[:k]]
+    nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+    
+    # Only the drivers that made the cut are materialised as dicts
+    nearest_ids = candidates['id'][nearest].tolist()
+    by_id = {}
+    for offset in range(0, len(nearest_ids), DRIVER_ID_BATCH):
+        for driver in get_drivers_by_ids(nearest_ids[offset:offset + DRIVER_ID_BATCH]):
+            by_id[driver['id']] = driver
+    
+    drivers = []
+    for driver_id, distance in zip(nearest_ids, distances[nearest].tolist()):
+        driver = by_id.get(driver_id)
+        if driver is not None:
+            driver['distance_km'] = distance
+            drivers.append(driver)
+    return drivers
+
+def update_driver_capacity(driver_id, capacity):
+    return _run_write(_update_driver_capacity_tx, driver_id, capacity)
+
+def _update_driver_capacity_tx(conn, driver_id, capacity):
+    conn.execute('''
         UPDATE drivers SET current_capacity = ? WHERE id = ?
     ''', (capacity, driver_id))
+    _record_changes(conn, [driver_id], 'capacity')
+    _touch(conn, 'drivers')
+
+def update_driver_capacities(updates):
+    updates = list(updates)
+    if not updates:
+        return 0
     
-    conn.commit()
-    conn.close()
+    return _run_write(_update_driver_capacities_tx, updates)
+
+def _update_driver_capacities_tx(conn, updates):
+    conn.executemany('''
+        UPDATE drivers SET current_capacity = MAX(0, MIN(?, max_capacity)) WHERE id = ?
+    ''', [(capacity, driver_id) for driver_id, capacity in updates])
+    _record_changes(conn, {driver_id for driver_id, _ in updates}, 'capacity')
+    _touch(conn, 'drivers')
+    return len(updates)
 
 def start_trip(driver_id, start_lat, start_lon, route):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    flush_location_updates()
     
-    cursor.execute('''
-        INSERT INTO trips (driver_id, start_time, start_lat, start_lon, route, status)
-        VALUES (?, ?, ?, ?, ?, 'active')
-    ''', (driver_id, datetime.now(), start_lat, start_lon, route))
+    return _run_write(_start_trip_tx, driver_id, start_lat, start_lon, route)
+
+def _start_trip_tx(conn, driver_id, start_lat, start_lon, route):
+    cursor = conn.execute('''
+        INSERT INTO trips (driver_id, start_time, start_lat, start_lon, route, status, last_lat, last_lon)
+        VALUES (?, ?, ?, ?, ?, 'active', ?, ?)
+    ''', (driver_id, datetime.now(), start_lat, start_lon, route, start_lat, start_lon))
+    _touch(conn, 'trips')
+    return cursor.lastrowid
+
+def end_trip(trip_id, end_lat, end_lon, distance=None, passengers=0):
+    flush_location_updates()
     
-    conn.commit()
-    trip_id = cursor.lastrowid
-    conn.close()
-    return trip_id
+    return _run_write(_end_trip_tx, trip_id, end_lat, end_lon, distance, passengers)
 
-def end_trip(trip_id, end_lat, end_lon, distance, passengers):
-    conn = sqlite3.connect(DB_PATH)
+def _end_trip_tx(conn, trip_id, end_lat, end_lon, distance=None, passengers=0):
     cursor = conn.cursor()
     
+    cursor.execute('''
+        SELECT driver_id, start_time, path_distance, last_lat, last_lon FROM trips WHERE id = ?
+    ''', (trip_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    driver_id, start_time, path_distance, last_lat, last_lon = row
+    
+    if distance is None:
+        distance = path_distance or 0.0
+        if last_lat is not None:
+            distance += _haversine_km(last_lat, last_lon, end_lat, end_lon)
+    
     cursor.execute('''
         UPDATE trips 
         SET end_time = ?, end_lat = ?, end_lon = ?, distance = ?, passengers = ?, status = 'completed'
-        WHERE id = ?
+        WHERE id = ? AND status = 'active'
     ''', (datetime.now(), end_lat, end_lon, distance, passengers, trip_id))
-    
-    cursor.execute('SELECT driver_id FROM trips WHERE id = ?', (trip_id,))
-    driver_id = cursor.fetchone()[0]
+    # A trip that was already ended must not be counted into the totals and rollups twice
+    if cursor.rowcount != 1:
+        return None
     
     cursor.execute('''
         UPDATE drivers 
@@ -262,40 +1871,144 @@ def end_trip(trip_id, end_lat, end_lon, distance, passengers):
         WHERE id = ?
     ''', (distance, driver_id))
     
-    conn.commit()
-    conn.close()
-
-def get_driver_trips(driver_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO trip_daily_rollup (driver_id, trip_date, trip_count, total_distance, total_passengers)
+        VALUES (?, date(?), 1, ?, ?)
+        ON CONFLICT (driver_id, trip_date) DO UPDATE SET
+            trip_count = trip_count + 1,
+            total_distance = total_distance + excluded.total_distance,
+            total_passengers = total_passengers + excluded.total_passengers
+    ''', (driver_id, str(start_time), distance, passengers))
     
     cursor.execute('''
-        SELECT * FROM trips WHERE driver_id = ? ORDER BY start_time DESC
-    ''', (driver_id,))
+        INSERT INTO trip_distance_bins (driver_id, bin, trip_count)
+        VALUES (?, ?, 1)
+        ON CONFLICT (driver_id, bin) DO UPDATE SET trip_count = trip_count + 1
+    ''', (driver_id, int(distance // DISTANCE_BIN_KM)))
+    _record_changes(conn, [driver_id], 'trip')
+    _touch(conn, 'trips', 'drivers')
+    return distance
+
+def _trip_from_row(row):
+    return {
+        'id': row[0],
+        'driver_id': row[1],
+        'start_time': row[2],
+        'end_time': row[3],
+        'start_lat': row[4],
+        'start_lon': row[5],
+        'end_lat': row[6],
+        'end_lon': row[7],
+        'distance': row[8],
+        'passengers': row[9],
+        'route': row[10],
+        'status': row[11],
+        'path_distance': row[12]
+    }
+
+def get_trip(trip_id):
+    row = _cached_fetch(('trips',), f'SELECT {_TRIP_SELECT} FROM trips WHERE id = ?', (trip_id,), one=True)
     
-    rows = cursor.fetchall()
-    conn.close()
+    if row:
+        return _trip_from_row(row)
+    return None
+
+def get_active_trip(driver_id):
+    row = _cached_fetch(('trips',), f'''
+        SELECT {_TRIP_SELECT} FROM trips
+        WHERE driver_id = ? AND status = 'active'
+        ORDER BY start_time DESC LIMIT 1
+    ''', (driver_id,), one=True)
     
-    trips = []
-    for row in rows:
-        trips.append({
-            'id': row[0],
-            'driver_id': row[1],
-            'start_time': row[2],
-            'end_time': row[3],
-            'start_lat': row[4],
-            'start_lon': row[5],
-            'end_lat': row[6],
-            'end_lon': row[7],
-            'distance': row[8],
-            'passengers': row[9],
-            'route': row[10],
-            'status': row[11]
-        })
+    if row:
+        return _trip_from_row(row)
+    return None
+
+def get_driver_trips(driver_id):
+    return list(iter_driver_trips(driver_id))
+
+def has_trips(driver_id):
+    row = _cached_fetch(('trips',), 'SELECT 1 FROM trips WHERE driver_id = ? LIMIT 1', (driver_id,), one=True, replica=True)
+    return row is not None
+
+def get_daily_trip_counts(driver_id):
+    rows = _cached_fetch(('trips',), '''
+        SELECT trip_date, trip_count, total_distance, total_passengers
+        FROM trip_daily_rollup WHERE driver_id = ? ORDER BY trip_date
+    ''', (driver_id,), replica=True)
+    
+    return [{
+        'date': row[0],
+        'trips': row[1],
+        'distance': row[2],
+        'passengers': row[3]
+    } for row in rows]
+
+def get_trip_distance_histogram(driver_id):
+    rows = _cached_fetch(('trips',), '''
+        SELECT bin, trip_count FROM trip_distance_bins WHERE driver_id = ? ORDER BY bin
+    ''', (driver_id,), replica=True)
+    
+    return [{
+        'bin_start_km': row[0] * DISTANCE_BIN_KM,
+        'bin_end_km': (row[0] + 1) * DISTANCE_BIN_KM,
+        'trips': row[1]
+    } for row in rows]
+
+def get_recent_trips(driver_id, limit=RECENT_TRIPS_LIMIT, status='completed'):
+    trips, _ = get_driver_trips_page(driver_id, limit=limit, status=status)
     return trips
 
+def get_driver_trips_page(driver_id, limit=TRIP_PAGE_SIZE, before=None, status=None):
+    # Keyset pagination: `before` is the (start_time, id) cursor returned with the previous page
+    query = f'SELECT {_TRIP_SELECT} FROM trips WHERE driver_id = ?'
+    params = (driver_id,)
+    if status is not None:
+        query += ' AND status = ?'
+        params += (status,)
+    if before is not None:
+        query += ' AND (start_time, id) < (?, ?)'
+        params += tuple(before)
+    query += ' ORDER BY start_time DESC, id DESC LIMIT ?'
+    params += (limit,)
+    
+    trips = [_trip_from_row(row) for row in _cached_fetch(('trips',), query, params, replica=True)]
+    
+    next_cursor = None
+    if len(trips) == limit:
+        next_cursor = (trips[-1]['start_time'], trips[-1]['id'])
+    return trips, next_cursor
+
+def iter_driver_trips(driver_id, page_size=TRIP_PAGE_SIZE, status=None):
+    cursor = None
+    while True:
+        trips, cursor = get_driver_trips_page(driver_id, limit=page_size, before=cursor, status=status)
+        yield from trips
+        if cursor is None:
+            return
+
+def get_trip_columns(driver_id, columns=('start_time', 'distance', 'passengers'), status=None, as_frame=False):
+    columns = _project(columns, TRIP_COLUMNS)
+    query = f"SELECT {', '.join(columns)} FROM trips WHERE driver_id = ?"
+    params = (driver_id,)
+    if status is not None:
+        query += ' AND status = ?'
+        params += (status,)
+    
+    result = _cached_columns(('trips',), query + ' ORDER BY start_time DESC, id DESC', params, replica=True)
+    return _to_frame(result) if as_frame else result
+
+def get_daily_trip_columns(driver_id, as_frame=False):
+    result = _cached_columns(('trips',), '''
+        SELECT trip_date AS date, trip_count AS trips, total_distance AS distance, total_passengers AS passengers
+        FROM trip_daily_rollup WHERE driver_id = ? ORDER BY trip_date
+    ''', (driver_id,), replica=True)
+    return _to_frame(result) if as_frame else result
+
 def add_review(driver_id, commuter_id, rating, comment):
-    conn = sqlite3.connect(DB_PATH)
+    return _run_write(_add_review_tx, driver_id, commuter_id, rating, comment)
+
+def _add_review_tx(conn, driver_id, commuter_id, rating, comment):
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -303,53 +2016,98 @@ def add_review(driver_id, commuter_id, rating, comment):
         VALUES (?, ?, ?, ?)
     ''', (driver_id, commuter_id, rating, comment))
     
+    star_column = f'stars_{int(rating)}'
+    cursor.execute(f'''
+        INSERT INTO driver_rating_stats (driver_id, rating_sum, rating_count, {star_column})
+        VALUES (?, ?, 1, 1)
+        ON CONFLICT (driver_id) DO UPDATE SET
+            rating_sum = rating_sum + excluded.rating_sum,
+            rating_count = rating_count + 1,
+            {star_column} = {star_column} + 1
+    ''', (driver_id, rating))
+    
     cursor.execute('''
-        SELECT AVG(rating), COUNT(*) FROM reviews WHERE driver_id = ?
+        SELECT rating_sum, rating_count FROM driver_rating_stats WHERE driver_id = ?
     ''', (driver_id,))
-    avg_rating, total_ratings = cursor.fetchone()
+    rating_sum, total_ratings = cursor.fetchone()
     
     cursor.execute('''
         UPDATE drivers SET average_rating = ?, total_ratings = ? WHERE id = ?
-    ''', (avg_rating, total_ratings, driver_id))
-    
-    conn.commit()
-    conn.close()
+    ''', (rating_sum / total_ratings, total_ratings, driver_id))
+    _record_changes(conn, [driver_id], 'rated')
+    _touch(conn, 'reviews', 'drivers')
 
-def get_driver_reviews(driver_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def get_driver_rating_summary(driver_id):
+    row = _cached_fetch(('reviews',), '''
+        SELECT rating_sum, rating_count, stars_1, stars_2, stars_3, stars_4, stars_5
+        FROM driver_rating_stats WHERE driver_id = ?
+    ''', (driver_id,), one=True, replica=True)
     
-    cursor.execute('''
+    if not row or not row[1]:
+        return {'average_rating': 0.0, 'total_ratings': 0, 'histogram': {i: 0 for i in range(1, 6)}}
+    return {
+        'average_rating': row[0] / row[1],
+        'total_ratings': row[1],
+        'histogram': {i: row[1 + i] for i in range(1, 6)}
+    }
+
+def _review_from_row(row):
+    return {
+        'id': row[0],
+        'driver_id': row[1],
+        'commuter_id': row[2],
+        'rating': row[3],
+        'comment': row[4],
+        'review_time': row[5],
+        'commuter_name': f"{row[6]} {row[7]}"
+    }
+
+def get_driver_reviews_page(driver_id, limit=REVIEW_PAGE_SIZE, before=None):
+    # Keyset pagination: `before` is the (review_time, id) cursor returned with the previous page
+    query = '''
         SELECT r.*, c.first_name, c.last_name 
         FROM reviews r
         JOIN commuters c ON r.commuter_id = c.id
         WHERE r.driver_id = ?
-        ORDER BY r.review_time DESC
-    ''', (driver_id,))
+    '''
+    params = (driver_id,)
+    if before is not None:
+        query += ' AND (r.review_time, r.id) < (?, ?)'
+        params += tuple(before)
+    query += ' ORDER BY r.review_time DESC, r.id DESC LIMIT ?'
+    params += (limit,)
     
-    rows = cursor.fetchall()
-    conn.close()
+    reviews = [_review_from_row(row) for row in _cached_fetch(('reviews', 'commuters'), query, params, replica=True)]
     
-    reviews = []
-    for row in rows:
-        reviews.append({
-            'id': row[0],
-            'driver_id': row[1],
-            'commuter_id': row[2],
-            'rating': row[3],
-            'comment': row[4],
-            'review_time': row[5],
-            'commuter_name': f"{row[6]} {row[7]}"
-        })
-    return reviews
+    next_cursor = None
+    if len(reviews) == limit:
+        next_cursor = (reviews[-1]['review_time'], reviews[-1]['id'])
+    return reviews, next_cursor
+
+def iter_driver_reviews(driver_id, page_size=REVIEW_PAGE_SIZE):
+    cursor = None
+    while True:
+        reviews, cursor = get_driver_reviews_page(driver_id, limit=page_size, before=cursor)
+        yield from reviews
+        if cursor is None:
+            return
+
+def get_review_columns(driver_id, columns=('rating', 'review_time'), as_frame=False):
+    columns = _project(columns, REVIEW_COLUMNS)
+    result = _cached_columns(('reviews',), f'''
+        SELECT {', '.join(columns)} FROM reviews WHERE driver_id = ?
+        ORDER BY review_time DESC, id DESC
+    ''', (driver_id,), replica=True)
+    return _to_frame(result) if as_frame else result
+
+def get_driver_reviews(driver_id, limit=None):
+    if limit is not None:
+        reviews, _ = get_driver_reviews_page(driver_id, limit=limit)
+        return reviews
+    return list(iter_driver_reviews(driver_id))
 
 def get_commuter_by_contact(contact_number):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM commuters WHERE contact_number = ?', (contact_number,))
-    row = cursor.fetchone()
-    conn.close()
+    row = _cached_fetch(('commuters',), 'SELECT * FROM commuters WHERE contact_number = ?', (contact_number,), one=True)
     
     if row:
         return {
@@ -362,3 +2120,14 @@ def get_commuter_by_contact(contact_number):
             'registration_time': row[7]
         }
     return None
+
+_WRITE_TRANSACTIONS = {
+    'add_driver': _add_driver_tx,
+    'add_commuter': _add_commuter_tx,
+    'update_driver_capacity': _update_driver_capacity_tx,
+    'update_driver_capacities': _update_driver_capacities_tx,
+    'start_trip': _start_trip_tx,
+    'end_trip': _end_trip_tx,
+    'add_review': _add_review_tx,
+    'attach_driver_photos': _attach_driver_photos_tx
+}
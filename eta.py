@@ -0,0 +1,29 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+AVG_SPEED_KMH = 20
+
+def haversine_km(origin, lats, lons):
+    lat0 = np.radians(origin[0])
+    lon0 = np.radians(origin[1])
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+
+    a = np.sin((lats - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def batch_eta(commuter_location, driver_locations, avg_speed_kmh=AVG_SPEED_KMH):
+    positions = np.asarray(driver_locations, dtype=np.float64).reshape(-1, 2)
+    distances = haversine_km(commuter_location, positions[:, 0], positions[:, 1])
+    eta_minutes = (distances / avg_speed_kmh * 60).astype(np.int64)
+    return eta_minutes, np.round(distances, 2)
+
+def attach_etas(drivers, commuter_location, avg_speed_kmh=AVG_SPEED_KMH):
+    if not drivers:
+        return drivers
+
+    eta_minutes, distances = batch_eta(commuter_location, [d['location'] for d in drivers], avg_speed_kmh)
+    for driver, eta, distance in zip(drivers, eta_minutes.tolist(), distances.tolist()):
+        driver['eta_minutes'] = eta
+        driver['distance_km'] = distance
+    return drivers
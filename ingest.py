@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import signal
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import database as db
+import metrics
+
+# Devices reach the service through a reverse proxy; bind 0.0.0.0 only together with a token
+HOST = "127.0.0.1"
+PORT = 8765
+INGEST_TOKEN = os.environ.get("JEEPTRACK_INGEST_TOKEN")
+
+QUEUE_SIZE = 20000
+BATCH_SIZE = 1000
+BATCH_WAIT_SECONDS = 0.5
+RETRY_DELAY_SECONDS = 1.0
+
+PINGS_PER_SECOND = 1.0
+PING_BURST = 10
+BUCKET_SWEEP_SECONDS = 60.0
+
+# Device clocks drift a little ahead; anything further out, or older than the retention window, is rejected
+MAX_CLOCK_SKEW_SECONDS = 300
+
+MAX_BODY_BYTES = 1024 * 1024
+
+logger = logging.getLogger("jeeptrack.ingest")
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable"
+}
+
+class IngestService:
+    def __init__(self, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE, pings_per_second=PINGS_PER_SECOND, burst=PING_BURST, token=INGEST_TOKEN):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.pings_per_second = pings_per_second
+        self.burst = burst
+        self.token = token
+        self.buckets = {}
+        self.last_sweep = time.monotonic()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+        self.stats = {'accepted': 0, 'rate_limited': 0, 'rejected': 0, 'overloaded': 0, 'written': 0}
+
+    def allow(self, driver_id, now):
+        tokens, last = self.buckets.get(driver_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.pings_per_second)
+        if tokens < 1:
+            self.buckets[driver_id] = (tokens, now)
+            return False
+        self.buckets[driver_id] = (tokens - 1, now)
+        return True
+
+    def evict_idle_buckets(self, now):
+        # A bucket that has refilled completely behaves exactly like a missing one
+        refill_seconds = self.burst / self.pings_per_second
+        idle = [driver_id for driver_id, (_, last) in self.buckets.items() if now - last >= refill_seconds]
+        for driver_id in idle:
+            del self.buckets[driver_id]
+        self.last_sweep = now
+
+    def submit(self, kind, items):
+        now = time.monotonic()
+        if now - self.last_sweep >= BUCKET_SWEEP_SECONDS:
+            self.evict_idle_buckets(now)
+        parsed_items = [parse_ping(item) if kind == 'ping' else parse_capacity(item) for item in items]
+        valid = [parsed for parsed in parsed_items if parsed is not None]
+        rejected = len(parsed_items) - len(valid)
+
+        # Capacity is checked before any tokens are spent, so a batch refused with 503 can be retried in full
+        if self.queue.maxsize - self.queue.qsize() < len(valid):
+            self.stats['overloaded'] += len(valid)
+            return 503, {'error': 'ingest queue is full, retry later'}
+
+        accepted = []
+        rate_limited = 0
+        for parsed in valid:
+            if self.allow(parsed[0], now):
+                accepted.append((kind, parsed))
+            else:
+                rate_limited += 1
+
+        for entry in accepted:
+            self.queue.put_nowait(entry)
+
+        self.stats['accepted'] += len(accepted)
+        self.stats['rejected'] += rejected
+        self.stats['rate_limited'] += rate_limited
+        return 200, {'accepted': len(accepted), 'rejected': rejected, 'rate_limited': rate_limited}
+
+    async def writer_loop(self):
+        # Runs until it dequeues the None sentinel from stop(); the batch in hand is still written,
+        # since every item in it was already acknowledged to the device
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            batch = [item]
+            deadline = loop.time() + BATCH_WAIT_SECONDS
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    self.queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self.write_batch(batch)
+
+    async def stop(self, writer_task):
+        await self.queue.put(None)
+        await writer_task
+        await self.drain()
+
+    async def write_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        pings = [item for kind, item in batch if kind == 'ping']
+        capacities = [item for kind, item in batch if kind == 'capacity']
+
+        while True:
+            try:
+                if pings:
+                    await loop.run_in_executor(self.executor, db.record_location_batch, pings)
+                if capacities:
+                    await loop.run_in_executor(self.executor, db.update_driver_capacities, capacities)
+                break
+            except sqlite3.Error:
+                logger.exception("Failed to write ingest batch of %d items, retrying", len(batch))
+                await asyncio.sleep(RETRY_DELAY_SECONDS)
+
+        self.stats['written'] += len(batch)
+        for _ in batch:
+            self.queue.task_done()
+
+    async def drain(self):
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            await self.write_batch(batch)
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = self.route(method, path, headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            write_response(writer, 413 if 'too large' in str(e) else 400, {'error': str(e)}, False)
+        finally:
+            writer.close()
+
+    def authorized(self, headers):
+        if not self.token:
+            return True
+        scheme, _, credential = headers.get('authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(credential.strip(), self.token)
+
+    def route(self, method, path, headers, body):
+        if path == '/health':
+            return 200, {'status': 'ok', 'queued': self.queue.qsize(), **self.stats}
+
+        if path not in ('/pings', '/capacity'):
+            return 404, {'error': 'not found'}
+        if not self.authorized(headers):
+            return 401, {'error': 'missing or invalid bearer token'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+
+        try:
+            data = json.loads(body or b'null')
+        except json.JSONDecodeError:
+            return 400, {'error': 'body must be JSON'}
+
+        key = 'pings' if path == '/pings' else 'updates'
+        items = data.get(key) if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return 400, {'error': f'expected a list or an object with "{key}"'}
+
+        return self.submit('ping' if path == '/pings' else 'capacity', items)
+
+def parse_ping(item):
+    try:
+        driver_id = int(item['driver_id'])
+        lat = float(item['lat'])
+        lon = float(item['lon'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+
+    now = datetime.now(timezone.utc)
+    if item.get('ts') is None:
+        ts = now
+    else:
+        try:
+            ts = datetime.fromtimestamp(float(item['ts']), timezone.utc)
+        except (TypeError, ValueError, OverflowError, OSError):
+            return None
+        if not now - timedelta(days=db.LOCATION_RETENTION_DAYS) <= ts <= now + timedelta(seconds=MAX_CLOCK_SKEW_SECONDS):
+            return None
+    return (driver_id, lat, lon, ts.strftime('%Y-%m-%d %H:%M:%S'))
+
+def parse_capacity(item):
+    try:
+        return (int(item['driver_id']), int(item['capacity']))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+async def read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise ValueError('malformed request line')
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0) or 0)
+    if length > MAX_BODY_BYTES:
+        raise ValueError('request body too large')
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target.split('?', 1)[0], headers, body
+
+def write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    headers = [
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}"
+    ]
+    if status == 503:
+        headers.append(f"Retry-After: {int(RETRY_DELAY_SECONDS) or 1}")
+    writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+
+async def serve(host=HOST, port=PORT, token=INGEST_TOKEN):
+    if host not in ('127.0.0.1', 'localhost', '::1') and not token:
+        logger.warning("GPS ingest is listening on %s without JEEPTRACK_INGEST_TOKEN; anyone who can reach it can post pings", host)
+    if metrics.ENABLED:
+        metrics.instrument_module(db, exclude=db.UNINSTRUMENTED)
+        metrics.start_exporters()
+    db.init_database()
+    service = IngestService(token=token)
+    writer_task = asyncio.create_task(service.writer_loop())
+    server = await asyncio.start_server(service.handle_client, host, port)
+    logger.info("GPS ingest listening on %s:%d", host, port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        await service.stop(writer_task)
+        service.executor.shutdown(wait=True)
+        logger.info("GPS ingest stopped after writing %d items", service.stats['written'])
+
+def main():
+    parser = argparse.ArgumentParser(description="JeepTrack PH GPS ingest service")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--token", default=INGEST_TOKEN, help="bearer token devices must send (default: JEEPTRACK_INGEST_TOKEN)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port, args.token))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
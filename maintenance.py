@@ -0,0 +1,44 @@
+import argparse
+import json
+import logging
+import time
+
+import database as db
+
+logger = logging.getLogger("jeeptrack.maintenance")
+
+def compact(loop=False, interval=db.COMPACTION_INTERVAL):
+    while True:
+        stats = db.compact_location_updates()
+        logger.info("Location compaction: %s", json.dumps(stats))
+        if not loop:
+            return stats
+        time.sleep(interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="JeepTrack PH database maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compact_parser = commands.add_parser("compact", help="expire, downsample and vacuum location history")
+    compact_parser.add_argument("--loop", action="store_true", help="keep running every --interval seconds")
+    compact_parser.add_argument("--interval", type=float, default=db.COMPACTION_INTERVAL)
+
+    commands.add_parser(
+        "enable-incremental-vacuum",
+        help="one-off full VACUUM that switches an existing database to incremental auto-vacuum"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.command == "compact":
+        try:
+            compact(args.loop, args.interval)
+        except KeyboardInterrupt:
+            pass
+    elif db.enable_incremental_vacuum():
+        logger.info("Switched %s to incremental auto-vacuum", db.DB_PATH)
+    else:
+        logger.info("%s already uses incremental auto-vacuum", db.DB_PATH)
+
+if __name__ == "__main__":
+    main()
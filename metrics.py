@@ -0,0 +1,253 @@
+import atexit
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.environ.get("JEEPTRACK_METRICS", "").lower() in ("1", "true", "yes", "on")
+METRICS_PORT = int(os.environ.get("JEEPTRACK_METRICS_PORT", "0") or 0)
+METRICS_LOG_PATH = os.environ.get("JEEPTRACK_METRICS_LOG")
+METRICS_LOG_INTERVAL = 60.0
+
+# Upper bounds of the latency histogram buckets, in seconds
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_series = {}
+_exporter_started = False
+
+def _new_series():
+    return {
+        'buckets': [0] * (len(DURATION_BUCKETS) + 1),
+        'count': 0,
+        'sum': 0.0,
+        'errors': 0,
+        'rows': 0,
+        'bytes': 0
+    }
+
+def _value_size(value):
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if value is None:
+        return 0
+    return getattr(value, 'nbytes', 8)
+
+def _item_size(item):
+    if isinstance(item, dict):
+        return sum(_value_size(v) for v in item.values())
+    if isinstance(item, (list, tuple)):
+        return sum(_value_size(v) for v in item)
+    return _value_size(item)
+
+def _result_size(result):
+    if result is None:
+        return 0, 0
+    if isinstance(result, (bytes, bytearray)):
+        return 1, len(result)
+    # Keyset pages come back as (rows, next_cursor)
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], list):
+        return _result_size(result[0])
+    # Change feed polls come back as (cursor, {driver_id: change_types})
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], int) and isinstance(result[1], dict):
+        return len(result[1]), 8 * len(result[1])
+    # DataFrames and arrays are checked by shape, so pandas and numpy are never imported here
+    if hasattr(result, 'memory_usage') and hasattr(result, 'columns'):
+        return len(result), int(result.memory_usage(index=False).sum())
+    if hasattr(result, 'nbytes') and hasattr(result, 'shape'):
+        return (result.shape[0] if result.shape else 1), result.nbytes
+    if isinstance(result, dict):
+        # Columnar reads map each column name to an array of the same length
+        columns = [v for v in result.values() if getattr(v, 'shape', None)]
+        if columns:
+            return columns[0].shape[0], sum(_value_size(v) for v in result.values())
+        return 1, _item_size(result)
+    if isinstance(result, (list, tuple)):
+        return len(result), sum(_item_size(item) for item in result)
+    return 0, _value_size(result)
+
+def record(name, seconds, rows=0, nbytes=0, error=False):
+    index = 0
+    while index < len(DURATION_BUCKETS) and seconds > DURATION_BUCKETS[index]:
+        index += 1
+
+    with _lock:
+        series = _series.get(name)
+        if series is None:
+            series = _series[name] = _new_series()
+        series['buckets'][index] += 1
+        series['count'] += 1
+        series['sum'] += seconds
+        series['rows'] += rows
+        series['bytes'] += nbytes
+        if error:
+            series['errors'] += 1
+
+@contextmanager
+def _timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        record(name, time.perf_counter() - start, error=True)
+        raise
+    record(name, time.perf_counter() - start)
+
+def timer(name):
+    if not ENABLED:
+        return nullcontext()
+    return _timer(name)
+
+def _wrap(name, func, measure_result):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            record(name, time.perf_counter() - start, error=True)
+            raise
+        elapsed = time.perf_counter() - start
+        if measure_result and inspect.isgenerator(result):
+            return _timed_iter(name, result, elapsed)
+        rows, nbytes = _result_size(result) if measure_result else (0, 0)
+        record(name, elapsed, rows, nbytes)
+        return result
+    wrapper.__wrapped_by_metrics__ = True
+    return wrapper
+
+def _timed_iter(name, generator, elapsed):
+    # Generators do their work as they are consumed, so only the time spent inside next() is counted
+    # and the series is recorded once, when iteration ends or the consumer stops early
+    rows = 0
+    nbytes = 0
+    error = False
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration:
+                elapsed += time.perf_counter() - start
+                return
+            except BaseException:
+                elapsed += time.perf_counter() - start
+                error = True
+                raise
+            elapsed += time.perf_counter() - start
+            rows += 1
+            nbytes += _item_size(item)
+            yield item
+    finally:
+        generator.close()
+        record(name, elapsed, rows, nbytes, error)
+
+def timed(name):
+    def decorator(func):
+        if not ENABLED:
+            return func
+        return _wrap(name, func, False)
+    return decorator
+
+def instrument_module(module, prefix=None, exclude=()):
+    prefix = prefix or module.__name__
+    for attr, func in list(vars(module).items()):
+        if attr.startswith('_') or attr in exclude or not callable(func) or isinstance(func, type):
+            continue
+        if getattr(func, '__module__', None) != module.__name__:
+            continue
+        if getattr(func, '__wrapped_by_metrics__', False):
+            continue
+        setattr(module, attr, _wrap(f"{prefix}.{attr}", func, True))
+
+def snapshot():
+    with _lock:
+        return {name: dict(series, buckets=list(series['buckets'])) for name, series in _series.items()}
+
+def reset():
+    with _lock:
+        _series.clear()
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+def render_text():
+    lines = [
+        "# HELP jeeptrack_call_duration_seconds Time spent in instrumented calls",
+        "# TYPE jeeptrack_call_duration_seconds histogram"
+    ]
+    series_by_name = sorted(snapshot().items())
+
+    for name, series in series_by_name:
+        label = _escape(name)
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, series['buckets']):
+            cumulative += count
+            lines.append(f'jeeptrack_call_duration_seconds_bucket{{name="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'jeeptrack_call_duration_seconds_bucket{{name="{label}",le="+Inf"}} {series["count"]}')
+        lines.append(f'jeeptrack_call_duration_seconds_sum{{name="{label}"}} {series["sum"]:.6f}')
+        lines.append(f'jeeptrack_call_duration_seconds_count{{name="{label}"}} {series["count"]}')
+
+    for metric, key, help_text in (
+        ('jeeptrack_call_errors_total', 'errors', 'Instrumented calls that raised'),
+        ('jeeptrack_call_rows_total', 'rows', 'Rows returned by instrumented calls'),
+        ('jeeptrack_call_bytes_total', 'bytes', 'Approximate payload bytes returned by instrumented calls')
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for name, series in series_by_name:
+            lines.append(f'{metric}{{name="{_escape(name)}"}} {series[key]}')
+
+    return '\n'.join(lines) + '\n'
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+def write_log(path=None):
+    path = path or METRICS_LOG_PATH
+    if not path or not _series:
+        return
+    with open(path, "a") as f:
+        f.write(f"# {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(render_text())
+
+def _log_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        write_log(path)
+
+def start_exporters():
+    global _exporter_started
+    if not ENABLED:
+        return
+
+    with _lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+    if METRICS_LOG_PATH:
+        threading.Thread(target=_log_loop, args=(METRICS_LOG_PATH, METRICS_LOG_INTERVAL), name="metrics-log", daemon=True).start()
+        atexit.register(write_log, METRICS_LOG_PATH)
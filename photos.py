@@ -0,0 +1,121 @@
+import atexit
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import database as db
+
+# Longest edge in pixels of each stored variant, largest first; only sizes the app reads are rendered
+PHOTO_VARIANTS = (('profile', 320),)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+PHOTO_WORKERS = int(os.environ.get("JEEPTRACK_PHOTO_WORKERS", "2") or 2)
+# "process" renders in a process pool so decoding and encoding never hold the app's GIL
+PHOTO_POOL = os.environ.get("JEEPTRACK_PHOTO_POOL", "thread").lower()
+
+logger = logging.getLogger("jeeptrack.photos")
+
+_lock = threading.Lock()
+_workers = None
+_render_pool = None
+_pending = {}
+
+def source_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def is_image(data):
+    from io import BytesIO
+    from PIL import Image, UnidentifiedImageError
+
+    # Image.open only parses the header, so this is cheap enough to run in the request. Oversized
+    # images are refused here too: past MAX_IMAGE_PIXELS Pillow only warns, past twice that it raises
+    try:
+        with Image.open(BytesIO(data)) as image:
+            pixels = image.width * image.height
+            return 0 < pixels and (Image.MAX_IMAGE_PIXELS is None or pixels <= Image.MAX_IMAGE_PIXELS)
+    except (UnidentifiedImageError, Image.DecompressionBombError, Image.DecompressionBombWarning, OSError, ValueError):
+        return False
+
+def _output_format():
+    from PIL import features
+
+    if features.check('webp'):
+        return 'WEBP', 'image/webp'
+    return 'JPEG', 'image/jpeg'
+
+def render_variants(data):
+    from io import BytesIO
+    from PIL import Image, ImageOps
+
+    fmt, mime_type = _output_format()
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if fmt == 'WEBP' and 'A' in image.getbands() else 'RGB')
+
+        variants = []
+        # Largest first, so each variant is thumbnailed from the previous one instead of the original
+        for variant, size in PHOTO_VARIANTS:
+            image.thumbnail((size, size))
+            out = BytesIO()
+            if fmt == 'WEBP':
+                image.save(out, format='WEBP', quality=WEBP_QUALITY, method=4)
+            else:
+                image.save(out, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            variants.append((variant, mime_type, out.getvalue()))
+    return variants
+
+def _start_pools():
+    global _workers, _render_pool
+
+    with _lock:
+        if _workers is None:
+            _workers = ThreadPoolExecutor(max_workers=PHOTO_WORKERS, thread_name_prefix="photo-worker")
+            if PHOTO_POOL == 'process':
+                import multiprocessing
+                _render_pool = ProcessPoolExecutor(max_workers=PHOTO_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(shutdown)
+        return _workers, _render_pool
+
+def _process_photo(driver_id, data, digest, render_pool):
+    try:
+        # An identical upload was rendered before, so only the links are written
+        if db.attach_driver_photos(driver_id, digest):
+            return digest
+        if render_pool is not None:
+            variants = render_pool.submit(render_variants, data).result()
+        else:
+            variants = render_variants(data)
+        db.attach_driver_photos(driver_id, digest, variants)
+        return digest
+    except Exception:
+        logger.exception("Failed to process the photo for driver %s", driver_id)
+        raise
+    finally:
+        with _lock:
+            _pending.pop(driver_id, None)
+
+def submit_driver_photo(driver_id, data):
+    workers, render_pool = _start_pools()
+    digest = source_hash(data)
+    with _lock:
+        _pending[driver_id] = digest
+    return workers.submit(_process_photo, driver_id, data, digest, render_pool)
+
+def is_pending(driver_id):
+    with _lock:
+        return driver_id in _pending
+
+def shutdown(wait=True):
+    global _workers, _render_pool
+
+    with _lock:
+        workers, render_pool = _workers, _render_pool
+        _workers = _render_pool = None
+    # Workers first: queued photos still need the render pool
+    if workers is not None:
+        workers.shutdown(wait=wait)
+    if render_pool is not None:
+        render_pool.shutdown(wait=wait)